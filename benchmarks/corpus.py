@@ -0,0 +1,150 @@
+import random
+
+SHAPES = ['wide', 'cte_chain', 'union', 'star', 'case']
+
+
+class Corpus():
+    def __init__(self, sqls, schema, columns, layers):
+        self.sqls = sqls
+        self.schema = schema
+        self.columns = columns
+        self.layers = layers
+
+    @property
+    def base_tables(self):
+        return [
+            f'{catalog}.{db}.{table}'
+            for catalog, dbs in self.schema.items()
+            for db, tables in dbs.items()
+            for table in tables
+        ]
+
+    @property
+    def marts(self):
+        return self.layers[-1]
+
+
+class CorpusGenerator():
+    def __init__(self, seed=0, *, base_tables=None, base_columns=20, layers=4, width=1.0,
+                 cte_depth=6, union_branches=6, case_depth=4, shapes=SHAPES):
+        self.rng = random.Random(seed)
+        self.base_tables = base_tables
+        self.base_columns = base_columns
+        self.layer_count = layers
+        self.width = width
+        self.cte_depth = cte_depth
+        self.union_branches = union_branches
+        self.case_depth = case_depth
+        self.shapes = shapes
+
+    def generate(self, models=100):
+        base_tables = self.base_tables or max(2, models // 5)
+        schema = {'bench': {'raw': {}}}
+        for i in range(base_tables):
+            schema['bench']['raw'][f'raw_{i}'] = [f'col_{j}' for j in range(self.base_columns)]
+
+        sqls = {}
+        columns = {}
+        layers = []
+
+        # staging models read the raw tables, every later layer reads the one before
+        staging = []
+        for i in range(max(1, models // self.layer_count)):
+            raw = f'raw_{i % base_tables}'
+            name = f'stg_{i}'
+            sqls[name] = f'SELECT * FROM bench.raw.{raw}'
+            columns[name] = list(schema['bench']['raw'][raw])
+            staging.append(name)
+        layers.append(staging)
+
+        remaining = models - len(staging)
+        for layer in range(1, self.layer_count):
+            count = remaining // (self.layer_count - layer)
+            remaining -= count
+            current = []
+            for i in range(count):
+                name = f'm{layer}_{i}'
+                shape = self.rng.choice(self.shapes)
+                sql, cols = getattr(self, f'_{shape}')(layers[-1], columns)
+                sqls[name] = sql
+                columns[name] = cols
+                current.append(name)
+            layers.append(current or layers[-1])
+
+        return Corpus(sqls, schema, columns, layers)
+
+    def _pick(self, upstream, columns, n=1):
+        models = self.rng.sample(upstream, min(n, len(upstream)))
+        return models, [columns[m] for m in models]
+
+    def _expression(self, column):
+        kind = self.rng.randrange(5)
+        if kind == 0:
+            return f'{column} + 1'
+        elif kind == 1:
+            return f'UPPER({column})'
+        elif kind == 2:
+            return f"COALESCE(CAST({column} AS TEXT), 'n/a')"
+        elif kind == 3:
+            return f"{column} || '_' || {column}"
+        return column
+
+    def _wide(self, upstream, columns):
+        (model,), (cols,) = self._pick(upstream, columns)
+        count = max(1, int(len(cols) * self.width * 5))
+        selects = []
+        out = []
+        for i in range(count):
+            column = cols[i % len(cols)]
+            out.append(f'w_{i}')
+            selects.append(f'{self._expression(column)} AS w_{i}')
+        return f'SELECT {", ".join(selects)} FROM {model}', out
+
+    def _cte_chain(self, upstream, columns):
+        (model,), (cols,) = self._pick(upstream, columns)
+        ctes = [f'c0 AS (SELECT * FROM {model})']
+        out = list(cols)
+        for depth in range(1, self.cte_depth):
+            column = self.rng.choice(out)
+            out = [c for c in out if c != column] + [column]
+            selects = out[:-1] + [f'{self._expression(column)} AS {column}']
+            ctes.append(f'c{depth} AS (SELECT {", ".join(selects)} FROM c{depth - 1})')
+        return f'WITH {", ".join(ctes)} SELECT * FROM c{len(ctes) - 1}', out
+
+    def _union(self, upstream, columns):
+        models, cols = self._pick(upstream, columns, self.union_branches)
+        shared = [c for c in cols[0] if all(c in other for other in cols[1:])] or None
+        branches = []
+        for i, model in enumerate(models):
+            if shared:
+                selects = [f"'{model}' AS branch"] + shared
+            else:
+                selects = [f"'{model}' AS branch", f'{columns[model][0]} AS value']
+            branches.append(f'SELECT {", ".join(selects)} FROM {model}')
+        out = ['branch'] + (shared or ['value'])
+        return ' UNION ALL '.join(branches), out
+
+    def _star(self, upstream, columns):
+        models, cols = self._pick(upstream, columns, 2)
+        if len(models) < 2:
+            return f'SELECT * FROM {models[0]}', list(cols[0])
+        left, right = models
+        sql = f'SELECT * FROM {left} a JOIN {right} b ON a.{cols[0][0]} = b.{cols[1][0]}'
+        return sql, list(cols[0]) + [c for c in cols[1] if c not in cols[0]]
+
+    def _case(self, upstream, columns):
+        (model,), (cols,) = self._pick(upstream, columns)
+        out = []
+        selects = []
+        for i in range(max(1, int(len(cols) * self.width))):
+            expression = 'NULL'
+            for depth in range(self.case_depth):
+                test, value = self.rng.choice(cols), self.rng.choice(cols)
+                expression = f"CASE WHEN {test} = '{depth}' THEN {value} ELSE {expression} END"
+            selects.append(f'{expression} AS case_{i}')
+            out.append(f'case_{i}')
+        return f'SELECT {", ".join(selects)} FROM {model}', out
+
+
+def generate_corpus(models=100, seed=0, **kwargs):
+    return CorpusGenerator(seed, **kwargs).generate(models)
@@ -0,0 +1,52 @@
+import sys
+import time
+from sqlglot import parse_one
+from sqlgraph.trace import SqlTrace
+
+# NULL operands keep the leaf handlers trivial and there are no column
+# references, so the timings are dominated by handler dispatch
+EXPRESSIONS = {
+    'null': "NULL",
+    'cast': "CAST(CAST(CAST(NULL AS TEXT) AS TEXT) AS TEXT)",
+    'comparison': "NULL = NULL AND NULL <> NULL OR NULL >= NULL AND NULL <= NULL",
+    'in': "NULL IN (NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL)",
+    'between': "NULL BETWEEN NULL AND NULL",
+    'case': "CASE WHEN NULL = NULL THEN NULL WHEN NULL < NULL THEN NULL ELSE NULL END",
+}
+
+
+def count_calls(tracer, e):
+    calls = 0
+    trace = tracer.trace
+    
+    def counting_trace(e):
+        nonlocal calls
+        calls += 1
+        return trace(e)
+    
+    tracer.trace = counting_trace
+    try:
+        tracer.trace(e)
+    finally:
+        del tracer.trace
+    return calls
+
+
+def run(repeat=20000):
+    tracer = SqlTrace.Tracer({})
+    results = {}
+    for name, sql in EXPRESSIONS.items():
+        e = parse_one(sql)
+        calls = count_calls(tracer, e)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            tracer.trace(e)
+        elapsed = time.perf_counter() - start
+        results[name] = elapsed / (repeat * calls) * 1e9
+    return results
+
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for name, ns in run(repeat).items():
+        print(f'{name:12} {ns:8.1f} ns/call')
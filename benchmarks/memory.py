@@ -0,0 +1,70 @@
+import sys
+import gc
+import tracemalloc
+from sqlgraph import model as mdl
+from sqlgraph.trace import SqlTrace
+from sqlgraph.schema import DictSchema
+from benchmarks.corpus import generate_corpus
+
+TABLE = mdl.Table('table', ['column'], db='db', catalog='catalog')
+
+# one representative instance per model class, children are shared so only
+# the instance itself is measured
+FACTORIES = {
+    'Table': lambda: mdl.Table('table', [], db='db', catalog='catalog'),
+    'TableSource': lambda: mdl.TableSource('table', {}, 'select'),
+    'ColumnSource': lambda: mdl.ColumnSource(TABLE, 'column'),
+    'ConstantSource': lambda: mdl.ConstantSource('NULL'),
+    'UnknownSource': lambda: mdl.UnknownSource('unknown'),
+    'CompositeSource': lambda: mdl.CompositeSource([], name='COALESCE'),
+    'TransformSource': lambda: mdl.TransformSource('UPPER', []),
+    'UnionSource': lambda: mdl.UnionSource(sources=[]),
+    'StructSource': lambda: mdl.StructSource({}),
+    'ComparisonSource': lambda: mdl.ComparisonSource('EQ', None, None),
+    'ConditionalSource': lambda: mdl.ConditionalSource(None, None, TABLE),
+    'PathSource': lambda: mdl.PathSource('path', None),
+}
+
+
+def measure(f, count):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        value = f(count)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return value, after - before
+
+
+def per_instance(count=10000):
+    results = {}
+    for name, factory in FACTORIES.items():
+        # the containers are allocated by the factories too, so their size is
+        # measured with empty containers and only the instances are left
+        _, size = measure(lambda n: [factory() for _ in range(n)], count)
+        _, overhead = measure(lambda n: [None for _ in range(n)], count)
+        results[name] = (size - overhead) / count
+    return results
+
+
+def trace(models=100, seed=0):
+    corpus = generate_corpus(models, seed=seed)
+    schema = DictSchema(corpus.schema)
+    tracemalloc.start()
+    try:
+        traced = SqlTrace.trace_sql(corpus.sqls, dialect='postgres', schema=schema)
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'models': models, 'current': current, 'peak': peak, 'tables': len(traced.tables)}
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    for name, size in per_instance(count).items():
+        print(f'{name:18} {size:8.1f} bytes')
+    result = trace()
+    print(f"trace of {result['models']} models: {result['current'] / 1e6:.1f}MB retained, {result['peak'] / 1e6:.1f}MB peak")
@@ -0,0 +1,162 @@
+import os
+import io
+import sys
+import json
+import time
+import platform
+import argparse
+import contextlib
+import sqlglot
+import networkx
+from sqlgraph.trace import SqlTrace
+from sqlgraph.schema import DictSchema
+from sqlgraph.filter import SimpleFilter
+from sqlgraph.transform import MappingTransform
+from benchmarks.corpus import generate_corpus
+
+SCALES = {
+    'small': 50,
+    'medium': 250,
+    'large': 1000,
+}
+
+STEPS = ['trace_sql', 'graph', 'group_source_mapping', 'simple_filter', 'mapping_transform']
+
+RESULTS_DIRECTORY = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def timed(f):
+    start = time.perf_counter()
+    value = f()
+    return value, time.perf_counter() - start
+
+
+def run_once(corpus, dialect='postgres'):
+    timings = {}
+    schema = DictSchema(corpus.schema)
+
+    trace, timings['trace_sql'] = timed(lambda: SqlTrace.trace_sql(corpus.sqls, dialect=dialect, schema=schema))
+    graph, timings['graph'] = timed(trace.to_graph)
+
+    graph.add_table_group('marts', corpus.marts)
+    graph.add_table_group('base', corpus.base_tables)
+    _, timings['group_source_mapping'] = timed(lambda: graph.get_group_source_mapping('marts', src_groups='base'))
+
+    # SimpleFilter prints every node it visits
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, timings['simple_filter'] = timed(
+            lambda: SimpleFilter(source_tables=corpus.base_tables, dest_tables=corpus.marts).apply(graph)
+        )
+
+    _, timings['mapping_transform'] = timed(
+        lambda: MappingTransform(from_tables=corpus.marts, to_tables=corpus.base_tables).apply(graph)
+    )
+
+    counts = {
+        'models': len(corpus.sqls),
+        'nodes': graph.g.number_of_nodes(),
+        'edges': graph.g.number_of_edges()
+    }
+    return timings, counts
+
+
+def run_scale(models, *, seed=0, repeat=1, **kwargs):
+    corpus = generate_corpus(models, seed=seed, **kwargs)
+    best = {}
+    for _ in range(repeat):
+        # every step reads the output of the one before, so each repeat starts from a fresh trace
+        timings, counts = run_once(corpus)
+        for step, elapsed in timings.items():
+            best[step] = min(best.get(step, elapsed), elapsed)
+    return {'timings': best, **counts}
+
+
+def run(scales=None, *, seed=0, repeat=1):
+    scales = scales or list(SCALES.keys())
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'sqlglot': sqlglot.__version__,
+            'networkx': networkx.__version__,
+            'seed': seed,
+            'repeat': repeat
+        },
+        'results': {
+            scale: run_scale(SCALES[scale], seed=seed, repeat=repeat)
+            for scale in scales
+        }
+    }
+
+
+def compare(results, baseline, *, threshold=0.1):
+    # ratios above 1 + threshold are reported as regressions
+    rows = []
+    for scale, current in results['results'].items():
+        previous = baseline['results'].get(scale)
+        if not previous:
+            continue
+        for step in STEPS:
+            new = current['timings'].get(step)
+            old = previous['timings'].get(step)
+            if new is None or not old:
+                continue
+            ratio = new / old
+            rows.append({
+                'scale': scale,
+                'step': step,
+                'baseline': old,
+                'current': new,
+                'ratio': ratio,
+                'regression': ratio > 1 + threshold
+            })
+    return rows
+
+
+def print_results(results):
+    for scale, result in results['results'].items():
+        print(f"{scale} ({result['models']} models, {result['nodes']} nodes, {result['edges']} edges)")
+        for step in STEPS:
+            print(f"  {step:22} {result['timings'][step]:10.3f}s")
+
+
+def print_comparison(rows):
+    for row in rows:
+        flag = ' REGRESSION' if row['regression'] else ''
+        print(
+            f"{row['scale']:8} {row['step']:22} {row['baseline']:10.3f}s -> {row['current']:10.3f}s "
+            f"({row['ratio']:.2f}x){flag}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the sqlgraph benchmark suite')
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES.keys()), default=['small', 'medium'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--output', help='results file, defaults to a timestamped file in benchmarks/results')
+    parser.add_argument('--compare', help='previous results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    results = run(args.scales, seed=args.seed, repeat=args.repeat)
+    print_results(results)
+
+    output = args.output or os.path.join(RESULTS_DIRECTORY, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'results written to {output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, threshold=args.threshold)
+        print_comparison(rows)
+        if any(row['regression'] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
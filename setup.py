@@ -23,6 +23,9 @@ setup(
     url="",
     keywords=["SQL Graph"],
     install_requires=REQUIRES,
+    extras_require={
+        "matrix": ["numpy", "scipy"],
+    },
     packages=['sqlgraph'],
     include_package_data=True,
     long_description_content_type='text/markdown',
@@ -0,0 +1,135 @@
+import os
+import pickle
+import hashlib
+import logging
+import sqlglot
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 2
+
+
+class ParseCache():
+    def __init__(self, directory, *, max_size=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(os.path.getsize(path) for path in self._entries())
+
+    @staticmethod
+    def dialect_name(dialect):
+        if dialect is None or type(dialect) == str:
+            return str(dialect)
+        if not isinstance(dialect, type):
+            dialect = dialect.__class__
+        return f'{dialect.__module__}.{dialect.__qualname__}'
+
+    def key(self, sql, dialect=None):
+        h = hashlib.sha256()
+        for part in [str(CACHE_VERSION), sqlglot.__version__, ParseCache.dialect_name(dialect), sql]:
+            h.update(part.encode('utf-8'))
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.pickle')
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as ex:
+            logger.warning(f'discarding unreadable parse cache entry {path}: {ex}')
+            self._remove(path)
+            return None
+
+        # keep access times current so eviction drops the least recently used entries
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # an overwritten entry is already counted in size
+        try:
+            replaced_size = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced_size = 0
+        os.replace(tmp_path, path)
+        self.size += os.path.getsize(path) - replaced_size
+
+        if self.max_size is not None and self.size > self.max_size:
+            self.evict()
+
+    def parse(self, sql, dialect=None, parser=sqlglot.parse):
+        key = self.key(sql, dialect)
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = parser(sql, dialect=dialect)
+        try:
+            self.put(key, value)
+        except Exception as ex:
+            logger.warning(f'unable to write parse cache entry: {ex}')
+        return value
+
+    def evict(self, max_size=None):
+        if max_size is None:
+            max_size = self.max_size
+
+        entries = []
+        for path in self._entries():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        self.size = sum(e[1] for e in entries)
+
+        # evict down to 90% so a full cache does not rescan on every write
+        target = max_size * 0.9
+        for _, size, path in sorted(entries):
+            if self.size <= target:
+                break
+            self._remove(path)
+            self.size -= size
+            self.evictions += 1
+
+    def clear(self):
+        self.evict(0)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': self.size
+        }
+
+    def _entries(self):
+        for root, dirs, files in os.walk(self.directory):
+            for file in files:
+                if file.endswith('.pickle'):
+                    yield os.path.join(root, file)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
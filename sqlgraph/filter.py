@@ -1,5 +1,6 @@
 import networkx as nx
 from pickle import TRUE
+from sqlgraph.reach import ReachabilityIndex
 
 class Selector():
     def select_node(self, g, node_id, **node_attrs):
@@ -36,6 +37,14 @@ class Filter():
     
 class SimpleFilter(Filter):
     def __init__(self, *, source_columns=None, dest_columns=None, source_tables=None, dest_tables=None, excluded_tables=None):
+        self.reachability = None
+        
+        def get_reachability(g):
+            # one index answers the upstream and downstream checks of every node in g
+            if self.reachability is None or not self.reachability.matches(g):
+                self.reachability = ReachabilityIndex.from_networkx(g)
+            return self.reachability
+        
         def select_node_1(g, node_id, **node_attrs):
             if node_attrs['type'] == 'column' and node_attrs['table_type'] == 'table':
                 table = node_attrs['table']
@@ -51,44 +60,33 @@ class SimpleFilter(Filter):
                 or table_column in ((source_columns or []) + (dest_columns or [])):
                     return True
                 
+                reachability = get_reachability(g)
                 if source_columns:
-                    valid = False
-                    sg = g.subgraph(nx.ancestors(g, node_id) | {node_id}).copy()
-                    for sgn_id in sg.nodes:
-                        if sgn_id in source_columns:
-                            valid = True
-                            break
-                    if not valid:
+                    if not any(
+                        sgn_id in reachability and reachability.is_upstream(sgn_id, node_id) 
+                        for sgn_id in source_columns
+                    ):
                         return False
                 
                 if dest_columns:
-                    valid = False
-                    sg = g.subgraph(nx.descendants(g, node_id) | {node_id}).copy()
-                    for sgn_id in sg.nodes:
-                        if sgn_id in dest_columns:
-                            valid = True
-                            break
-                    if not valid:
+                    if not any(
+                        sgn_id in reachability and reachability.is_upstream(node_id, sgn_id) 
+                        for sgn_id in dest_columns
+                    ):
                         return False
                     
                 if source_tables:
-                    valid = False
-                    sg = g.subgraph(nx.ancestors(g, node_id) | {node_id}).copy()
-                    for sgn_id in sg.nodes:
-                        if sg.nodes[sgn_id].get('table') in source_tables:
-                            valid = True
-                            break
-                    if not valid:
+                    if not any(
+                        g.nodes[sgn_id].get('table') in source_tables 
+                        for sgn_id in reachability.ancestors(node_id)
+                    ):
                         return False
                     
                 if dest_tables:
-                    valid = False
-                    sg = g.subgraph(nx.descendants(g, node_id) | {node_id}).copy()
-                    for sgn_id in sg.nodes:
-                        if sg.nodes[sgn_id].get('table') in dest_tables:
-                            valid = True
-                            break
-                    if not valid:
+                    if not any(
+                        g.nodes[sgn_id].get('table') in dest_tables 
+                        for sgn_id in reachability.descendants(node_id)
+                    ):
                         return False
 
                 return True
@@ -126,6 +124,11 @@ class SimpleFilter(Filter):
                 FunctionSelector(select_node=select_node_2)
             ]
         )
+
+    def apply(self, g):
+        # the graph may have changed since the last apply
+        self.reachability = None
+        return super().apply(g)
                 
                 
                 
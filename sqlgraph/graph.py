@@ -4,6 +4,10 @@ from sqlgraph import model as mdl
 import textwrap
 from copy import deepcopy
 from sqlgraph.model import TableSource, Table
+from sqlgraph.store import GraphStore
+from sqlgraph.reach import ReachabilityIndex
+from sqlgraph.index import NodeIndex
+from sqlgraph.view import SubgraphView
 import logging
 import json
 
@@ -71,12 +75,151 @@ DISPLAY_SETTINGS = {
 class SqlGraph():
 
     def __init__(self, tables=None, *, table_group=None):
+        self.version = 0
         self.g = DiGraph()
+        self.reachable = False
         self.tables = {}
+        self._source_attributes = {}
+        self._restored_groups = {}
         if tables:
             for table in tables.values():
                 self.add_table(table, table_group)
             #self.add_mappings(mappings, table_group=table_group) 
+    
+    @property
+    def g(self):
+        # a compacted graph is expanded back into networkx on first direct use
+        if self._g is None:
+            self._g = self.store.to_networkx()
+            self._move_indexes(self.store, self._g)
+            self.store = None
+        return self._g
+    
+    @g.setter
+    def g(self, g):
+        self._g = g
+        self.version += 1
+        self.store = None
+        self.reachability = None
+        self.indexes = None
+    
+    def compact(self):
+        if self.store is None:
+            self.store = GraphStore.from_networkx(self._g)
+            self._move_indexes(self._g, self.store)
+            self._g = None
+        return self
+    
+    def _move_indexes(self, graph, other):
+        # the nodes and their attributes are the same on both sides
+        if self.indexes is not None and self.indexes.matches(graph, self.version):
+            self.indexes.graph = other
+        else:
+            self.indexes = None
+    
+    def _get_indexes(self):
+        # built on first use and kept up to date by the SqlGraph methods, nodes
+        # or groups changed directly on g need a reset_indexes
+        graph = self.store if self.store is not None else self._g
+        if self.indexes is None or not self.indexes.matches(graph, self.version):
+            if self.store is not None:
+                nodes = ((node_id, self.store.node(node_id)) for node_id in self.store.nodes)
+            else:
+                nodes = self._g.nodes.items()
+            self.indexes = NodeIndex(graph, nodes, self.version)
+        return self.indexes
+    
+    def reset_indexes(self):
+        self.indexes = None
+    
+    def _changed(self, indexed=False):
+        # indexes that were current and were kept up to date with the change stay valid
+        if indexed and self.indexes is not None and self.indexes.version == self.version:
+            self.indexes.version += 1
+        self.version += 1
+    
+    def get_node(self, node_id):
+        if self.store is not None:
+            return self.store.node(node_id)
+        return self._g.nodes[node_id]
+    
+    def build_reachability(self):
+        self.reachable = True
+        self.reachability = None
+        self._get_reachability()
+        return self
+    
+    def _get_reachability(self):
+        # the index is rebuilt on the next query once the SqlGraph methods have
+        # changed the graph, nodes or edges edited directly on g need a reset_reachability
+        if not self.reachable:
+            return None
+        graph = self.store if self.store is not None else self._g
+        if self.reachability is None or not self.reachability.matches(graph, self.version):
+            if self.store is not None:
+                self.reachability = ReachabilityIndex.from_store(self.store, self.version)
+            else:
+                self.reachability = ReachabilityIndex.from_networkx(self._g, self.version)
+        return self.reachability
+    
+    def reset_reachability(self):
+        self.reachability = None
+    
+    def ancestors(self, node_id):
+        reachability = self._get_reachability()
+        if reachability is not None:
+            return reachability.ancestors(node_id)
+        if self.store is not None:
+            return self.store.ancestors(node_id)
+        return nx.ancestors(self._g, node_id)
+    
+    def descendants(self, node_id):
+        reachability = self._get_reachability()
+        if reachability is not None:
+            return reachability.descendants(node_id)
+        if self.store is not None:
+            return self.store.descendants(node_id)
+        return nx.descendants(self._g, node_id)
+    
+    def is_upstream(self, src_id, dest_id):
+        reachability = self._get_reachability()
+        if reachability is not None:
+            return reachability.is_upstream(src_id, dest_id)
+        return src_id in self.ancestors(dest_id)
+    
+    def _walk(self, node_ids, upstream, *, stops=None):
+        reached = set(node_ids)
+        stack = list(reached)
+        while stack:
+            node_id = stack.pop()
+            if stops and node_id in stops:
+                continue
+            for other_id in self._neighbours(node_id, upstream):
+                if other_id not in reached:
+                    reached.add(other_id)
+                    stack.append(other_id)
+        return reached
+    
+    def _get_graph_view(self, node_id, table_groups, upstream):
+        if table_groups and _type(table_groups) != list:
+            table_groups = [table_groups]  
+            
+        filter_edge = None
+        if table_groups:
+            # nothing is walked past a group node and its edges further out are cut
+            stops = set(self.get_nodes_in_groups(table_groups))
+            node_ids = self._walk([node_id], upstream, stops=stops)
+            if upstream:
+                filter_edge = lambda u, v: v not in stops
+            else:
+                filter_edge = lambda u, v: u not in stops
+        elif upstream:
+            node_ids = self.ancestors(node_id) | {node_id}
+        else:
+            node_ids = self.descendants(node_id) | {node_id}
+            
+        g = self.store if self.store is not None else self._g
+        return SubgraphView.create(g, node_ids, filter_edge=filter_edge)
             
     def to_dict(self):
         return {
@@ -105,6 +248,7 @@ class SqlGraph():
         for edge in d.get('edges', []):
             self.g.add_edge(*edge['vertices'], **edge.get('attributes', {}))
             
+        self._changed()
         return self
     
     def from_file(self, filename):
@@ -117,30 +261,22 @@ class SqlGraph():
         
     @staticmethod
     def intersects(l1, l2):
+        if type(l1) == str:
+            l1 = [l1]
         return len([l for l in l1 if l in l2]) > 0
 
-    @staticmethod
-    def _sub_graph(cls, g, src_nodes, dest_nodes):
-        included_edges = set()
-        included_nodes = set()
-        for src_id in src_nodes:
-            for dest_id in dest_nodes:
-                for p in nx.all_simple_edge_paths(g, src_id, dest_id):
-                    for edge in p:
-                        included_nodes.add(edge[0])
-                        included_nodes.add(edge[1])
-                        included_edges.add(str(edge))
-                    
-        def node_filter(node_id):
-            return node_id in included_nodes
-        
-        return g.subgraph(
-                nx.subgraph_view(
-                    g, 
-                    filter_node=node_filter,
-                    filter_edge=lambda x,y: str([x,y]) in included_edges
-                )
-            )
+    def between(self, src_nodes, dest_nodes):
+        # a node is on a path when it is reached from a source and reaches a
+        # destination, every edge between two such nodes is on a path too
+        src_nodes = list(src_nodes)
+        dest_nodes = list(dest_nodes)
+        graph = self.store if self.store is not None else self._g
+        for node_id in src_nodes + dest_nodes:
+            if node_id not in graph:
+                raise ValueError(f'node {node_id} is not in the graph')
+            
+        node_ids = self._walk(src_nodes, False) & self._walk(dest_nodes, True)
+        return SubgraphView.create(graph, node_ids)
         
     @classmethod 
     def transform_graph(cls, g, edge_transform):
@@ -209,32 +345,98 @@ class SqlGraph():
         if table_groups and type(table_groups) != list:
             table_groups = [table_groups]
         
-        return [
-            node_id 
-            for node_id, attrs 
-            in nx.get_node_attributes(
-                self.g, 'groups', []
-            ).items() 
-            if SqlGraph.intersects(table_groups, attrs)
-        ]
-        
+        return NodeIndex.get(self._get_indexes().groups, table_groups or [])
+    
+    def get_table_nodes(self, table_id):
+        return list(self._get_indexes().tables.get(table_id, {}))
     
     def add_table_group(self, table_group, tables):
-        for node_id in self.g.nodes:
-            node = self.g.nodes[node_id]
-            if node['type'] == 'column':
-                for group_table_id in tables:
-                    if Table.ids_match(group_table_id, node['table']):
-                        if type(tables) != dict or node['column'] in tables[group_table_id]:
+        if type(tables) == str:
+            tables = [tables]
+            
+        indexes = self._get_indexes()
+        for group_table_id in tables:
+            # only tables with the same name can match the id
+            group_table = Table.from_id(group_table_id)
+            for table_id in list(indexes.names.get(group_table.name, {})):
+                if not group_table.matches_id(table_id):
+                    continue
+                for node_id in list(indexes.tables[table_id]):
+                    node = self.get_node(node_id)
+                    if type(tables) != dict or node['column'] in tables[group_table_id]:
+                        if self.store is not None:
+                            self.store.set_node_attribute(node_id, 'groups', node.get('groups', []) + [table_group])
+                        else:
                             node.setdefault('groups', []).append(table_group)
+                        indexes.add_group(node_id, table_group)
         
     def add_table(self, table, table_group=None):
-        for column in table.columns:
-            src = table.sources[column] if _type(table) == TableSource else None
-            self._add_column(table, column, src)
+        # tables already pulled in as upstream sources keep their nodes
+        if table.id not in self.tables:
+            self.tables[table.id] = table
+            built = {}
+            for column in table.columns:
+                src = table.sources[column] if _type(table) == TableSource else None
+                self._add_column(table, column, src, built)
             
         if table_group:
-            self.add_table_group(table_group, table.name)
+            self.add_table_group(table_group, table.id)
+    
+    def remove_table(self, table_id):
+        removed = set(self.get_table_nodes(table_id))
+        
+        # walk upstream through the nodes only this table's columns depend on,
+        # stopping at the columns of other models and schema tables
+        stack = list(removed)
+        while stack:
+            node_id = stack.pop()
+            for pred_id in self.g.predecessors(node_id):
+                if pred_id in removed:
+                    continue
+                pred = self.g.nodes[pred_id]
+                if pred.get('type') == 'column' and pred.get('table_type') == 'table':
+                    continue
+                if all(succ_id in removed for succ_id in self.g.successors(pred_id)):
+                    removed.add(pred_id)
+                    stack.append(pred_id)
+        
+        # schema tables nothing refers to any more go too, a fresh build would
+        # not have pulled them in
+        schema_tables = set()
+        for node_id in removed:
+            for pred_id in self.g.predecessors(node_id):
+                pred = self.g.nodes[pred_id]
+                if pred_id not in removed and pred.get('type') == 'column' and _type(self.tables.get(pred['table'])) == Table:
+                    schema_tables.add(pred['table'])
+        for schema_table_id in schema_tables:
+            column_ids = self.get_table_nodes(schema_table_id)
+            if all(succ_id in removed for column_id in column_ids for succ_id in self.g.successors(column_id)):
+                removed.update(column_ids)
+        
+        removed = {node_id: self.g.nodes[node_id] for node_id in removed}
+        self.g.remove_nodes_from(removed)
+        for node_id, attrs in removed.items():
+            self.indexes.remove(node_id, attrs)
+        self._changed(True)
+        self.tables.pop(table_id, None)
+        for attrs in removed.values():
+            if attrs.get('type') == 'column':
+                self.tables.pop(attrs['table'], None)
+        return removed
+    
+    def replace_tables(self, removed_table_ids, tables):
+        groups = {}
+        for table_id in list(removed_table_ids) + [table.id for table in tables]:
+            for node_id, attrs in self.remove_table(table_id).items():
+                if attrs.get('groups'):
+                    groups[node_id] = attrs['groups']
+        
+        # nodes that come back get the groups they were assigned before as
+        # they are added, so the group indexes stay in graph order
+        self._restored_groups = groups
+        for table in tables:
+            self.add_table(table)
+        self._restored_groups = {}
         
     # def add_mappings(self, mappings, *, table_group=None):
     #     for table, cols in mappings.items():
@@ -254,7 +456,7 @@ class SqlGraph():
             node.update(display_settings)
         return node
                 
-    def _add_column(self, table, column, source):
+    def _add_column(self, table, column, source, built=None):
         node = {
             'id': f'{table}.{column}',
             'type': 'column',
@@ -268,41 +470,80 @@ class SqlGraph():
         node_id = self._add_node(node)
         
         if source:
-            self._add_node_source(node_id, source)
+            self._add_node_source(node_id, source, built=built)
 
     def _add_node(self, node):
         logger.debug(f'ADD NODE: {node["id"]}')
-        self.g.add_node(node['id'], **{k: v for k,v in node.items() if k != 'id'})
+        attrs = dict(self.g.nodes[node['id']]) if node['id'] in self.g else None
+        new_attrs = {k: v for k,v in node.items() if k != 'id'}
+        if node['id'] in self._restored_groups:
+            new_attrs['groups'] = self._restored_groups.pop(node['id'])
+        self.g.add_node(node['id'], **new_attrs)
+        if self.indexes is not None:
+            if attrs is None:
+                self.indexes.add(node['id'], self.g.nodes[node['id']])
+            else:
+                self.indexes.update(node['id'], attrs, self.g.nodes[node['id']])
+        self._changed(True)
         return node['id']
     
     def _add_edge(self, src_node, dest_node, **attributes):
         logger.debug(f'ADD EDGE: {src_node}->{dest_node}')
+        # nodes the edge adds on its own are missing from the indexes
+        indexed = src_node in self.g and dest_node in self.g
         self.g.add_edge(src_node, dest_node, **attributes)
+        self._changed(indexed)
         
-    def _add_node_source(self, dest_id, source, *, seq=None, edge_label=None):
+    def _get_source_attributes(self, source):
+        # to_dict walks the whole subtree, shared sources only pay for it once
+        cached = self._source_attributes.get(id(source))
+        if cached is None or cached[0] is not source:
+            cached = (source, {k: v for k,v in source.to_dict().items() if k != 'sources'})
+            self._source_attributes[id(source)] = cached
+        return cached[1]
+        
+    def _add_node_source(self, dest_id, source, *, seq=None, edge_label=None, built=None):
         if type(source) == mdl.PathSource:
-            return self._add_node_source(dest_id, source.source, edge_label=source.path)
+            return self._add_node_source(dest_id, source.source, edge_label=source.path, built=built)
+
+        edge_attrs = {
+            'seq': seq,
+            'notes': source.notes,
+        }
+        if edge_label:
+            edge_attrs['label'] = edge_label
+        
+        # interned subtrees are shared between the columns of a table, one that
+        # was built already is only linked, unless it feeds this node already
+        if built is not None and type(source) != mdl.ColumnSource:
+            src_id = built.get(id(source))
+            if src_id is not None and not self.g.has_edge(src_id, dest_id):
+                self._add_edge(src_id, dest_id, **edge_attrs)
+                return
 
         additional_attributes = {}
         if type(source) == mdl.ColumnSource:
+            # sources are shared between tables, so the source itself is left untouched
             if isinstance(source.table, Table):
-                if source.table.id not in self.tables:
-                    for c in source.table.columns:
+                table = source.table
+                if table.id not in self.tables:
+                    table_built = {}
+                    for c in table.columns:
                         self._add_column(
-                            source.table, 
+                            table, 
                             c, 
-                            source.table.sources[c] if _type(source.table) == TableSource else None
+                            table.sources[c] if _type(table) == TableSource else None,
+                            table_built
                         )
-                    self.tables[source.table.id] = source.table
-                additional_attributes = {'table_type': source.table.type}
-                source.table = source.table.id
+                    self.tables[table.id] = table
+                additional_attributes = {'table_type': table.type}
+                table_id = table.id
             else:
                 additional_attributes = {'table_type': 'table'}
-                
-        
+                table_id = source.table
         
         if type(source) == mdl.ColumnSource:
-            src_id =  f'{source.table}.{source.column}'
+            src_id =  f'{table_id}.{source.column}'
         else:
             src_id = f'{dest_id}.source'
             if edge_label is not None:
@@ -310,71 +551,44 @@ class SqlGraph():
             elif seq is not None:
                 src_id += f'.[{seq}]'
         
-        src_attributes = {k: v for k,v in source.to_dict().items() if k != 'sources'}
+        src_attributes = self._get_source_attributes(source)
         
         src_node = {'id': src_id, **src_attributes, **additional_attributes}
         
         src_node = self._apply_display_settings(src_node)
         
         self._add_node(src_node)
+        if built is not None and type(source) != mdl.ColumnSource:
+            built.setdefault(id(source), src_id)
         
-        edge_attrs = {
-            'seq': seq,
-            'notes': source.notes,
-        }
-        if edge_label:
-            edge_attrs['label'] = edge_label
         self._add_edge(src_id, dest_id, **edge_attrs)
         
         if hasattr(source, 'sources'):
             if _type(source.sources) == dict:
                 for sn, ss in source.sources.items():
-                    self._add_node_source(src_id, ss, edge_label=sn)
+                    self._add_node_source(src_id, ss, edge_label=sn, built=built)
             else:
                 for i in range(len(source.sources)):
-                    self._add_node_source(src_id, source.sources[i], seq=i, edge_label=f'[{i}]')
+                    self._add_node_source(src_id, source.sources[i], seq=i, edge_label=f'[{i}]', built=built)
         
         if hasattr(source, 'source'):
-            self._add_node_source(src_id, source.source)
+            self._add_node_source(src_id, source.source, built=built)
 
         if _type(source) == mdl.ComparisonSource:
-            self._add_node_source(src_id, source.left, edge_label='LEFT')
-            self._add_node_source(src_id, source.right, edge_label='RIGHT')
+            self._add_node_source(src_id, source.left, edge_label='LEFT', built=built)
+            self._add_node_source(src_id, source.right, edge_label='RIGHT', built=built)
 
         if _type(source) == mdl.ConditionalSource:
-            self._add_node_source(src_id, source.condition, edge_label='IF')
-            self._add_node_source(src_id, source.true_value, edge_label='THEN')
-            self._add_node_source(src_id, source.false_value, edge_label='ELSE')
+            self._add_node_source(src_id, source.condition, edge_label='IF', built=built)
+            self._add_node_source(src_id, source.true_value, edge_label='THEN', built=built)
+            self._add_node_source(src_id, source.false_value, edge_label='ELSE', built=built)
         
     def get_source_graph(self, node_id, table_groups=None):
-        if table_groups and _type(table_groups) != list:
-            table_groups = [table_groups]  
-            
-        sg = self.g.subgraph(nx.ancestors(self.g, node_id) | {node_id}).copy()
-
-        if table_groups:
-            for n in sg.nodes:
-                if SqlGraph.intersects(table_groups, sg.nodes[n].get('groups', [])):
-                    #remove everything upstream
-                    for edge in list(sg.in_edges(n)):
-                        sg.remove_edge(*edge)
-            sg = sg.subgraph(nx.ancestors(sg, node_id) | {node_id}).copy()
-        return sg
+        # read only, materialize() gives a graph that can be changed
+        return self._get_graph_view(node_id, table_groups, True)
         
     def get_dest_graph(self, node_id, table_groups=None):
-        if table_groups and _type(table_groups) != list:
-            table_groups = [table_groups]  
-            
-        sg = self.g.subgraph(nx.descendants(self.g, node_id) | {node_id}).copy()
-
-        if table_groups:
-            for n in sg.nodes:
-                if SqlGraph.intersects(table_groups, sg.nodes[n].get('groups', [])):
-                    #remove everything upstream
-                    for edge in list(sg.out_edges(n)):
-                        sg.remove_edge(*edge)
-            sg = sg.subgraph(nx.descendants(sg, node_id) | {node_id}).copy()
-        return sg
+        return self._get_graph_view(node_id, table_groups, False)
 
 
                         
@@ -428,10 +642,104 @@ class SqlGraph():
         return {k: d[k] for k in sorted(d.keys())}
         
     
+    def _neighbours(self, node_id, upstream):
+        if self.store is not None:
+            return self.store.predecessors(node_id) if upstream else self.store.successors(node_id)
+        return self._g.pred[node_id] if upstream else self._g.succ[node_id]
+    
+    def _sweep(self, node_ids, upstream, *, stops=None, selected=None):
+        # one walk over the closure of node_ids, every node gets the set of
+        # selected nodes it reaches (itself included) and whether a struct is
+        # on the way; the walk does not go past stop nodes. returns None on a cycle
+        reached = {}
+        structs = {}
+        visiting = set()
+        for start in node_ids:
+            if start in reached:
+                continue
+            visiting.add(start)
+            stack = [(start, iter(() if stops and stops(start) else self._neighbours(start, upstream)))]
+            while stack:
+                node_id, neighbours = stack[-1]
+                for other_id in neighbours:
+                    if other_id in visiting:
+                        return None
+                    if other_id not in reached:
+                        visiting.add(other_id)
+                        stack.append((other_id, iter(() if stops and stops(other_id) else self._neighbours(other_id, upstream))))
+                        break
+                else:
+                    stack.pop()
+                    visiting.discard(node_id)
+                    other_ids = [] if stops and stops(node_id) else list(self._neighbours(node_id, upstream))
+                    own = selected is not None and selected(node_id)
+                    if len(other_ids) == 1 and not own:
+                        # a single input passes its set on without a copy
+                        reached[node_id] = reached[other_ids[0]]
+                    else:
+                        nodes = set()
+                        for other_id in other_ids:
+                            nodes |= reached[other_id]
+                        if own:
+                            nodes.add(node_id)
+                        reached[node_id] = frozenset(nodes)
+                    structs[node_id] = self.get_node(node_id)['type'] == 'struct' or any(structs[other_id] for other_id in other_ids)
+        return reached, structs
+    
+    def _get_group_source_mappings(self, node_ids, *, dest_groups=None, src_groups=None, excluded_groups=None):
+        # the same selection as get_source_mapping for all node_ids at once,
+        # nodes left out of the result go through get_source_mapping
+        if src_groups:
+            in_groups = set(self.get_nodes_in_groups(src_groups))
+            swept = self._sweep(node_ids, True, stops=in_groups.__contains__, selected=in_groups.__contains__)
+        else:
+            skipped = set(self.get_nodes_in_groups(dest_groups)) | set(self.get_nodes_in_groups(excluded_groups))
+            def column(node_id):
+                node = self.get_node(node_id)
+                return node['type'] == 'column' and \
+                    node.get('table_type') not in ['sq', 'cte', 'temp'] and \
+                    node_id not in skipped
+            
+            swept = self._sweep(
+                node_ids,
+                True, 
+                selected=lambda node_id: column(node_id) or self.get_node(node_id)['type'] in ['constant', 'unknown']
+            )
+        if swept is None:
+            return {}
+        
+        reached, structs = swept
+        mappings = {}
+        for node_id in node_ids:
+            # struct nodes need the path names, the per node walk handles them
+            if structs[node_id]:
+                continue
+            if src_groups:
+                mappings[node_id] = sorted(reached[node_id])
+            else:
+                sources = reached[node_id] - {node_id}
+                nodes = [self.get_node(source_id) for source_id in sources]
+                mappings[node_id] = (
+                    sorted(source_id for source_id in sources if column(source_id)) or 
+                    sorted(node['constant'] for node in nodes if node['type'] == 'constant') or 
+                    sorted(node['UNKNOWN'] for node in nodes if node['type'] == 'unknown')
+                )
+        return mappings
+    
     def get_group_source_mapping(self, dest_groups, *, src_groups=None, excluded_groups=None):
         mapping = {}
-        for node_id in self.get_nodes_in_groups(dest_groups):
-            node = self.g.nodes[node_id]
+        node_ids = self.get_nodes_in_groups(dest_groups)
+        mappings = self._get_group_source_mappings(
+            node_ids, 
+            dest_groups=dest_groups, 
+            src_groups=src_groups, 
+            excluded_groups=excluded_groups
+        )
+        for node_id in node_ids:
+            node = self.get_node(node_id)
+            if node_id in mappings:
+                mapping.setdefault(node['table'], {})[node['column']] = mappings[node_id]
+                continue
             mapping.setdefault(node['table'], {})[node['column']] = self.get_source_mapping(
                 node_id, 
                 dest_groups=dest_groups, 
@@ -462,7 +770,7 @@ class SqlGraph():
                 if sgn_id == node_id:
                     continue
                 if sg.nodes[sgn_id]['type'] == 'column' and \
-                   sg.nodes[sgn_id].get('table_type') not in ['sq', 'cte'] and \
+                   sg.nodes[sgn_id].get('table_type') not in ['sq', 'cte', 'temp'] and \
                    not SqlGraph.intersects(dest_groups or [], sg.nodes[sgn_id].get('groups', [])) and \
                    not SqlGraph.intersects(excluded_groups or [], sg.nodes[sgn_id].get('groups', [])):
                     mapped[sgn_id] = self.get_source_path_attributes(node_id, sgn_id, g=sg)
@@ -471,11 +779,14 @@ class SqlGraph():
                 elif sg.nodes[sgn_id]['type'] == 'unknown':
                     unknowns.append(sg.nodes[sgn_id]['UNKNOWN'])
         
+        # sorted like the group mappings, the subgraph nodes come in set order
         names = [v for v in mapped.values() if v]
         if not len(names):
-            mapped = list(mapped.keys())      
+            mapped = sorted(mapped.keys())
+        else:
+            mapped = SqlGraph.sort_dict(mapped)
         
-        return mapped or constants or unknowns
+        return mapped or sorted(constants) or sorted(unknowns)
     
     def get_source_path_attributes(self, dest_id, src_id, *, g=None):
         if not g:
@@ -499,10 +810,48 @@ class SqlGraph():
         attributes = {k: v for k,v in attributes.items() if v is not None}
         return attributes if len(attributes) > 0 else None
 
+    def _get_group_dest_mappings(self, node_ids, *, src_groups=None, dest_groups=None, excluded_groups=None):
+        if dest_groups:
+            in_groups = set(self.get_nodes_in_groups(dest_groups))
+            swept = self._sweep(node_ids, False, stops=in_groups.__contains__, selected=in_groups.__contains__)
+            # the path names are looked up on the whole graph, past the stop nodes
+            structs = self._sweep(node_ids, False)
+            if swept is None or structs is None:
+                return {}
+            reached, structs = swept[0], structs[1]
+        else:
+            skipped = set(self.get_nodes_in_groups(src_groups)) | set(self.get_nodes_in_groups(excluded_groups))
+            swept = self._sweep(
+                node_ids,
+                False,
+                selected=lambda node_id: self.get_node(node_id)['type'] == 'column' and \
+                    self.get_node(node_id).get('table_type') not in ['sq', 'cte', 'temp'] and \
+                    node_id not in skipped
+            )
+            if swept is None:
+                return {}
+            reached, structs = swept
+        
+        return {
+            node_id: sorted(reached[node_id] - {node_id})
+            for node_id in node_ids
+            if not structs[node_id]
+        }
+    
     def get_group_dest_mapping(self, src_groups, *, dest_groups=None, excluded_groups=None):
         mapping = {}
-        for node_id in self.get_nodes_in_groups(src_groups):
-            node = self.g.nodes[node_id]
+        node_ids = self.get_nodes_in_groups(src_groups)
+        mappings = self._get_group_dest_mappings(
+            node_ids, 
+            src_groups=src_groups, 
+            dest_groups=dest_groups, 
+            excluded_groups=excluded_groups
+        )
+        for node_id in node_ids:
+            node = self.get_node(node_id)
+            if node_id in mappings:
+                mapping.setdefault(node['table'], {})[node['column']] = mappings[node_id]
+                continue
             mapping.setdefault(node['table'], {})[node['column']] = self.get_dest_mapping(
                 node_id,
                 src_groups=src_groups,
@@ -533,14 +882,16 @@ class SqlGraph():
                 if sgn_id == node_id:
                     continue
                 if sg.nodes[sgn_id]['type'] == 'column' and \
-                   sg.nodes[sgn_id].get('table_type') not in ['sq', 'cte'] and \
+                   sg.nodes[sgn_id].get('table_type') not in ['sq', 'cte', 'temp'] and \
                    not SqlGraph.intersects(src_groups or [], sg.nodes[sgn_id].get('groups', [])) and \
                    not SqlGraph.intersects(excluded_groups or [], sg.nodes[sgn_id].get('groups', [])):
                     mapped[sgn_id] = self.get_dest_path_attributes(node_id, sgn_id) 
                     
         names = [v for v in mapped.values() if v]
         if not len(names):
-            mapped = list(mapped.keys())  
+            mapped = sorted(mapped.keys())
+        else:
+            mapped = SqlGraph.sort_dict(mapped)
             
         return mapped
     
@@ -601,14 +952,73 @@ class SqlGraph():
         if table_groups and type(table_groups) != list:
             table_groups = [table_groups]
             
-        def node_filter(node_id):
-            attrs = self.g.nodes[node_id]
-            if types and attrs['type'] not in types:
+        indexes = self._get_indexes()
+        if types:
+            node_ids = NodeIndex.get(indexes.types, types)
+        else:
+            node_ids = self.store.nodes if self.store is not None else self._g.nodes
+        if table_groups:
+            in_groups = set(NodeIndex.get(indexes.groups, table_groups))
+            node_ids = [node_id for node_id in node_ids if node_id in in_groups]
+        return {node_id: self.get_node(node_id) for node_id in node_ids}
+    
+    def to_lineage_matrix(self, *, src_types=None, src_groups=None, dest_types=None, dest_groups=None):
+        # optional dependency, only needed for the matrix export
+        import numpy as np
+        from scipy import sparse
+        
+        if src_groups and type(src_groups) != list:
+            src_groups = [src_groups]
+        if dest_groups and type(dest_groups) != list:
+            dest_groups = [dest_groups]
+        
+        if self.store is not None:
+            node_ids = self.store.nodes
+            nodes = [self.store.node(node_id) for node_id in node_ids]
+            offsets = np.array(self.store.out_offsets, dtype=np.int64)
+            targets = np.array(self.store.out_targets, dtype=np.int64)
+        else:
+            node_ids = list(self._g.nodes)
+            nodes = [self._g.nodes[node_id] for node_id in node_ids]
+            index = {node_id: i for i, node_id in enumerate(node_ids)}
+            offsets = np.zeros(len(node_ids) + 1, dtype=np.int64)
+            targets = []
+            for i, node_id in enumerate(node_ids):
+                targets.extend(index[succ_id] for succ_id in self._g.succ[node_id])
+                offsets[i + 1] = len(targets)
+            targets = np.array(targets, dtype=np.int64)
+        n = len(node_ids)
+        adjacency = sparse.csr_matrix((np.ones(len(targets), dtype=bool), targets, offsets), shape=(n, n))
+        
+        # subquery, cte and temp columns and the transform nodes between columns
+        # are walked through but never show up as rows or columns
+        def selected(node, types, groups):
+            if node['type'] not in (types or ['column']):
                 return False
-            if table_groups and not SqlGraph.intersects(table_groups, attrs.get('groups', [])):
+            if node['type'] == 'column' and node.get('table_type') in ['sq', 'cte', 'temp']:
                 return False
-            return True
-        return nx.subgraph_view(self.g, filter_node=node_filter).nodes
+            return not groups or SqlGraph.intersects(groups, node.get('groups', []))
+        
+        src_index = np.array([i for i, node in enumerate(nodes) if selected(node, src_types, src_groups)], dtype=np.int64)
+        dest_index = np.array([i for i, node in enumerate(nodes) if selected(node, dest_types, dest_groups)], dtype=np.int64)
+        
+        # breadth first from every source row at once, one product per level
+        frontier = sparse.csr_matrix(
+            (np.ones(len(src_index), dtype=bool), (np.arange(len(src_index)), src_index)), 
+            shape=(len(src_index), n)
+        )
+        reached = sparse.csr_matrix((len(src_index), n), dtype=bool)
+        while frontier.nnz:
+            frontier = (frontier @ adjacency) > reached
+            reached = reached + frontier
+        
+        matrix = reached[:, dest_index].tocsr()
+        matrix.sort_indices()
+        return (
+            matrix, 
+            np.array([node_ids[i] for i in src_index], dtype=object), 
+            np.array([node_ids[i] for i in dest_index], dtype=object)
+        )
     
     # def get_columns(self, *, table_groups=None):
     #     column_nodes = self.get_nodes(types=['column'], table_groups=table_groups)
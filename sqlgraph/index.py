@@ -0,0 +1,66 @@
+class NodeIndex():
+    def __init__(self, graph, nodes, version=None):
+        # nodes are (node_id, attributes) pairs, every index maps a key to the
+        # node ids in insertion order
+        self.graph = graph
+        self.version = version
+        self.types = {}
+        self.tables = {}
+        self.names = {}
+        self.table_types = {}
+        self.groups = {}
+        for node_id, attrs in nodes:
+            self.add(node_id, attrs)
+
+    def matches(self, graph, version=None):
+        return graph is self.graph and version == self.version
+
+    @staticmethod
+    def _add(index, key, node_id):
+        index.setdefault(key, {})[node_id] = None
+
+    @staticmethod
+    def _remove(index, key, node_id):
+        node_ids = index.get(key)
+        if node_ids is not None:
+            node_ids.pop(node_id, None)
+            if not node_ids:
+                del index[key]
+
+    @staticmethod
+    def _keys(attrs):
+        keys = [('types', attrs.get('type'))]
+        if attrs.get('type') == 'column':
+            keys += [('tables', attrs['table']), ('table_types', attrs.get('table_type'))]
+        keys += [('groups', group) for group in attrs.get('groups', [])]
+        return keys
+
+    def add(self, node_id, attrs):
+        for name, key in NodeIndex._keys(attrs):
+            NodeIndex._add(getattr(self, name), key, node_id)
+        if attrs.get('type') == 'column':
+            NodeIndex._add(self.names, attrs['table'].split('.')[-1], attrs['table'])
+
+    def remove(self, node_id, attrs, *, kept=()):
+        for name, key in NodeIndex._keys(attrs):
+            if (name, key) not in kept:
+                NodeIndex._remove(getattr(self, name), key, node_id)
+        if attrs.get('type') == 'column' and attrs['table'] not in self.tables:
+            NodeIndex._remove(self.names, attrs['table'].split('.')[-1], attrs['table'])
+
+    def update(self, node_id, attrs, new_attrs):
+        # keys the node keeps hold on to its place, so the indexes stay in graph order
+        self.remove(node_id, attrs, kept=NodeIndex._keys(new_attrs))
+        self.add(node_id, new_attrs)
+
+    def add_group(self, node_id, group):
+        NodeIndex._add(self.groups, group, node_id)
+
+    @staticmethod
+    def get(index, keys):
+        if len(keys) == 1:
+            return list(index.get(keys[0], {}))
+        node_ids = {}
+        for key in keys:
+            node_ids.update(index.get(key, {}))
+        return list(node_ids)
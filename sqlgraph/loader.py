@@ -0,0 +1,89 @@
+import os
+import mmap
+import locale
+import logging
+from fnmatch import fnmatch
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class SqlLoader():
+    def __init__(self, directory, *, include=None, exclude=None, extensions=['.sql'], workers=8, mmap_threshold=None, encoding=None):
+        self.directory = directory
+        self.include = [include] if type(include) == str else include
+        self.exclude = [exclude] if type(exclude) == str else exclude
+        self.extensions = [extensions] if type(extensions) == str else extensions
+        self.workers = workers
+        self.mmap_threshold = mmap_threshold
+        self.encoding = encoding
+        self._index = None
+
+    @classmethod
+    def get(cls, directory, **kwargs):
+        if isinstance(directory, SqlLoader):
+            return directory
+        return cls(directory, **kwargs)
+
+    def matches(self, path):
+        if self.extensions is not None and not any(path.endswith(ext) for ext in self.extensions):
+            return False
+        if self.include and not any(fnmatch(path, pattern) for pattern in self.include):
+            return False
+        if self.exclude and any(fnmatch(path, pattern) for pattern in self.exclude):
+            return False
+        return True
+
+    def model_name(self, file):
+        if self.extensions is None:
+            return os.path.splitext(file)[0]
+        for ext in self.extensions:
+            if file.endswith(ext):
+                return file[0:-len(ext)] if ext else file
+        return file
+
+    def index(self):
+        # walked once per loader and shared by list_models, read and trace_directory
+        if self._index is None:
+            index = {}
+            for root, dirs, files in os.walk(self.directory):
+                for file in files:
+                    path = os.path.join(root, file)
+                    rel_path = os.path.relpath(path, self.directory).replace(os.sep, '/')
+                    if not self.matches(rel_path):
+                        continue
+                    model = self.model_name(file)
+                    if model in index:
+                        logger.warning(f'model {model} in {rel_path} replaces {index[model]}')
+                    index[model] = path
+            self._index = index
+        return self._index
+
+    def models(self):
+        return list(self.index().keys())
+
+    def read_file(self, path):
+        encoding = self.encoding or locale.getpreferredencoding(False)
+        if self.mmap_threshold is not None:
+            size = os.path.getsize(path)
+            if size >= self.mmap_threshold and size > 0:
+                with open(path, 'rb') as f:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                        return m[:].decode(encoding)
+        with open(path, encoding=encoding) as f:
+            return f.read()
+
+    def read(self, models=None):
+        index = self.index()
+        if models is None:
+            models = list(index.keys())
+        else:
+            models = [model for model in models if model in index]
+
+        paths = [index[model] for model in models]
+        if self.workers and self.workers > 1 and len(paths) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                sqls = list(pool.map(self.read_file, paths))
+        else:
+            sqls = [self.read_file(path) for path in paths]
+        return dict(zip(models, sqls))
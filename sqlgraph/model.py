@@ -1,12 +1,30 @@
 
 
+import sys
+
+_type = type
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) == str else value
+
+
 class Table():
+    __slots__ = ('name', 'db', 'catalog', 'columns', 'type', '_id')
+    
     def __init__(self, name, columns, db=None, catalog=None, type='table'):
         self.name = name
         self.db = db
         self.catalog = catalog
-        self.columns = columns
+        self.columns = [_intern(c) for c in columns] if _type(columns) == list else columns
         self.type = type
+    
+    def __setattr__(self, name, value):
+        # the id is cached, so it is reset whenever one of its parts changes
+        if name in ('name', 'db', 'catalog'):
+            value = _intern(value)
+            object.__setattr__(self, '_id', None)
+        object.__setattr__(self, name, value)
         
     @staticmethod
     def get_id(name, db=None, catalog=None):
@@ -19,11 +37,13 @@ class Table():
        
     @property 
     def id(self):
-        return Table.get_id(
-            self.name, 
-            self.db, 
-            self.catalog
-        )
+        if self._id is None:
+            self._id = Table.get_id(
+                self.name, 
+                self.db, 
+                self.catalog
+            )
+        return self._id
         
     def __str__(self):
         return self.id
@@ -81,7 +101,83 @@ class Table():
     def ids_match(table_id1, table_id2):
         return Table.from_id(table_id1).matches_id(table_id2)
     
+_slots = {}
+
+
+def _state(obj):
+    # slot attributes first, then anything a subclass without slots added
+    cls = type(obj)
+    names = _slots.get(cls)
+    if names is None:
+        names = _slots[cls] = [
+            name 
+            for c in reversed(cls.__mro__) 
+            for name in c.__dict__.get('__slots__', ())
+            if name not in ('__dict__', '__weakref__')
+        ]
+    state = [(name, getattr(obj, name, None)) for name in names]
+    if hasattr(obj, '__dict__'):
+        state.extend(obj.__dict__.items())
+    return state
+
+
+def _key_value(value):
+    if value is None or type(value) == str:
+        return value
+    elif isinstance(value, (Source, Table)):
+        return id(value)
+    elif type(value) == list:
+        return tuple(_key_value(v) for v in value)
+    elif type(value) == dict:
+        return tuple((k, _key_value(v)) for k, v in value.items())
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+class SourceInterner():
+    def __init__(self):
+        self.sources = {}
+        self.interned = set()
+        
+    def intern(self, source):
+        if type(source) == dict:
+            return {k: self.intern(v) for k, v in source.items()}
+        if not isinstance(source, Source) or id(source) in self.interned:
+            return source
+        
+        for name, value in _state(source):
+            if value is None or type(value) == str:
+                continue
+            elif type(value) == list:
+                # new containers, the originals may be shared with other sources
+                setattr(source, name, [self.intern(v) for v in value])
+            elif type(value) == dict:
+                setattr(source, name, {k: self.intern(v) for k, v in value.items()})
+            elif isinstance(value, Source) and id(value) not in self.interned:
+                setattr(source, name, self.intern(value))
+        
+        key = source.key()
+        canonical = self.sources.get(key)
+        if canonical is None:
+            self.sources[key] = source
+            self.interned.add(id(source))
+            canonical = source
+        return canonical
+    
+    def clear(self):
+        self.sources.clear()
+        self.interned.clear()
+        
+    def __len__(self):
+        return len(self.sources)
+
+
 class Source():
+    __slots__ = ('notes', 'internal')
+    
     def __init__(self, *, notes=None, internal=None):
         self.notes = notes
         self.internal = internal
@@ -98,10 +194,20 @@ class Source():
     def as_list(self):
         return [self]
     
+    def children(self):
+        return []
+    
+    def key(self):
+        # children are interned before their parents, so they are compared by identity
+        state = _state(self)
+        return (type(self), tuple(name for name, _ in state), tuple(_key_value(value) for _, value in state))
+    
     def __str__(self):
         return str(self.to_dict())
         
 class CompositeSource(Source):
+    __slots__ = ('sources', 'name')
+    
     def __init__(self, sources=[], *, name=None, **kwargs):
         Source.__init__(self, **kwargs)
         self.sources = sources
@@ -109,6 +215,11 @@ class CompositeSource(Source):
                 
     def as_list(self):
         return self.sources
+    
+    def children(self):
+        if not self.sources:
+            return []
+        return list(self.sources.values()) if type(self.sources) == dict else list(self.sources)
         
     def to_dict(self):
         d = {
@@ -125,9 +236,14 @@ class CompositeSource(Source):
         return d
     
 class StructSource(Source):
+    __slots__ = ('sources',)
+    
     def __init__(self, sources, *args, **kwargs):
         self.sources = sources
         super().__init__(*args, **kwargs)
+    
+    def children(self):
+        return list(self.sources.values())
         
     def to_dict(self):
         d = {
@@ -141,7 +257,11 @@ class StructSource(Source):
         return d
     
 class TableSource(Table):
+    __slots__ = ('sources',)
+    
     def __init__(self, name, sources, type, *, db=None, catalog=None):
+        if _type(sources) == dict:
+            sources = {sys.intern(c): s for c, s in sources.items()}
         super().__init__(name, list(sources.keys()), db=db, catalog=catalog, type=type)
         self.sources = sources
         
@@ -154,6 +274,8 @@ class TableSource(Table):
         return d
     
 class TransformSource(CompositeSource):
+    __slots__ = ()
+    
     def __init__(self, transform, sources, **kwargs):
         if sources and not type(sources) == list and not type(sources) == dict:
             sources = [sources]
@@ -168,6 +290,8 @@ class TransformSource(CompositeSource):
         return d
 
 class UnknownSource(Source):
+    __slots__ = ('msg',)
+    
     def __init__(self, msg, **kwargs):
         Source.__init__(self, **kwargs)
         self.msg = msg
@@ -181,6 +305,8 @@ class UnknownSource(Source):
         return d
 
 class ConstantSource(Source):
+    __slots__ = ('value',)
+    
     def __init__(self, value, **kwargs):
         Source.__init__(self, **kwargs)
         self.value = value
@@ -194,10 +320,12 @@ class ConstantSource(Source):
         return d
         
 class ColumnSource(Source):
+    __slots__ = ('table', 'column')
+    
     def __init__(self, table, column, **kwargs):
         Source.__init__(self, **kwargs)
         self.table = table
-        self.column = column
+        self.column = _intern(column)
         
     def to_dict(self):
         d = {
@@ -209,11 +337,16 @@ class ColumnSource(Source):
         return d
 
 class ComparisonSource(Source):
+    __slots__ = ('name', 'left', 'right')
+    
     def __init__(self, name, left, right, **kwargs):
         Source.__init__(self, **kwargs)
         self.name = name
         self.left = left
         self.right = right
+    
+    def children(self):
+        return [self.left, self.right]
         
     def to_dict(self):
         d = {
@@ -228,11 +361,16 @@ class ComparisonSource(Source):
        
     
 class ConditionalSource(Source):
+    __slots__ = ('condition', 'true_value', 'false_value')
+    
     def __init__(self, condition, true_value, false_value=None, **kwargs):
         Source.__init__(self, **kwargs)
         self.condition = condition
         self.true_value = true_value
         self.false_value = false_value if false_value else ConstantSource('NULL')
+    
+    def children(self):
+        return [self.condition, self.true_value, self.false_value]
         
     def to_dict(self):
         d = {
@@ -246,10 +384,15 @@ class ConditionalSource(Source):
     
         
 class PathSource(Source):
+    __slots__ = ('path', 'source')
+    
     def __init__(self, path, source, **kwargs):
         Source.__init__(self, **kwargs)
         self.path = path
         self.source = source
+    
+    def children(self):
+        return [self.source]
         
     def to_dict(self):
         d = {
@@ -261,6 +404,8 @@ class PathSource(Source):
         return d
     
 class UnionSource(CompositeSource):
+    __slots__ = ()
+    
     def __init__(self, left=None, right=None, *, sources=[], **kwargs):
         sources = sources
         if type(left) == UnionSource:
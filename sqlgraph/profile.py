@@ -0,0 +1,104 @@
+import json
+import time
+
+
+class TraceProfile():
+    def __init__(self):
+        self.models = {}
+        self.expressions = {}
+        self.caches = {}
+        self._stack = []
+
+    def start(self):
+        self._stack.append(0.0)
+        return time.perf_counter()
+
+    def stop(self, start):
+        # time spent in nested timers is removed from the self time of the caller
+        elapsed = time.perf_counter() - start
+        child_time = self._stack.pop()
+        if self._stack:
+            self._stack[-1] += elapsed
+        return elapsed, elapsed - child_time
+
+    def record_model(self, table_id, start):
+        elapsed, self_time = self.stop(start)
+        stats = self.models.setdefault(table_id, {'time': 0.0, 'self_time': 0.0})
+        stats['time'] += elapsed
+        stats['self_time'] += self_time
+
+    def record_expression(self, expression_type, start):
+        elapsed, self_time = self.stop(start)
+        stats = self.expressions.setdefault(expression_type.__name__, {'calls': 0, 'time': 0.0, 'self_time': 0.0})
+        stats['calls'] += 1
+        stats['time'] += elapsed
+        stats['self_time'] += self_time
+
+    def record_cache(self, cache, hit):
+        stats = self.caches.setdefault(cache, {'hits': 0, 'misses': 0})
+        stats['hits' if hit else 'misses'] += 1
+
+    def merge(self, other):
+        if type(other) == dict:
+            other = TraceProfile.from_dict(other)
+        for table_id, stats in other.models.items():
+            self.models[table_id] = dict(stats)
+        for name, stats in other.expressions.items():
+            totals = self.expressions.setdefault(name, {'calls': 0, 'time': 0.0, 'self_time': 0.0})
+            for k, v in stats.items():
+                totals[k] += v
+        for cache, stats in other.caches.items():
+            totals = self.caches.setdefault(cache, {'hits': 0, 'misses': 0})
+            for k, v in stats.items():
+                totals[k] += v
+        return self
+
+    def to_dict(self):
+        return {
+            'models': {
+                table_id: self.models[table_id]
+                for table_id in sorted(self.models, key=lambda k: -self.models[k]['self_time'])
+            },
+            'expressions': {
+                name: self.expressions[name]
+                for name in sorted(self.expressions, key=lambda k: -self.expressions[k]['self_time'])
+            },
+            'caches': self.caches
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        profile = cls()
+        profile.models = {k: dict(v) for k, v in d.get('models', {}).items()}
+        profile.expressions = {k: dict(v) for k, v in d.get('expressions', {}).items()}
+        profile.caches = {k: dict(v) for k, v in d.get('caches', {}).items()}
+        return profile
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def to_file(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def from_file(cls, filename):
+        with open(filename) as f:
+            return cls.from_dict(json.load(f))
+
+    def diff(self, other):
+        # positive values mean this profile is slower (or busier) than the other
+        def diff_section(mine, theirs):
+            return {
+                key: {
+                    k: mine.get(key, {}).get(k, 0) - theirs.get(key, {}).get(k, 0)
+                    for k in set(mine.get(key, {})) | set(theirs.get(key, {}))
+                }
+                for key in set(mine) | set(theirs)
+            }
+
+        return {
+            'models': diff_section(self.models, other.models),
+            'expressions': diff_section(self.expressions, other.expressions),
+            'caches': diff_section(self.caches, other.caches)
+        }
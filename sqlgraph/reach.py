@@ -0,0 +1,182 @@
+from array import array
+from bisect import bisect_right
+
+
+class ReachabilityIndex():
+    def __init__(self, graph, nodes, predecessors, successors, version=None):
+        # the graph and the version it was built at are kept to notice when the
+        # index goes stale, the owner bumps the version on every change
+        self.graph = graph
+        self.version = version
+        self.nodes = nodes
+        self.index = {node_id: i for i, node_id in enumerate(nodes)}
+        self.predecessors = predecessors
+        self.successors = successors
+        self.components, self.members = self._condense()
+        self.upstream = None
+        self.downstream = None
+
+    @classmethod
+    def from_networkx(cls, g, version=None):
+        nodes = list(g.nodes)
+        index = {node_id: i for i, node_id in enumerate(nodes)}
+        predecessors = [[index[p] for p in g.pred[node_id]] for node_id in nodes]
+        successors = [[index[s] for s in g.succ[node_id]] for node_id in nodes]
+        return cls(g, nodes, predecessors, successors, version)
+
+    @classmethod
+    def from_store(cls, store, version=None):
+        predecessors = [
+            list(store.in_sources[store.in_offsets[i]:store.in_offsets[i + 1]])
+            for i in range(len(store))
+        ]
+        successors = [
+            list(store.out_targets[store.out_offsets[i]:store.out_offsets[i + 1]])
+            for i in range(len(store))
+        ]
+        return cls(store, store.nodes, predecessors, successors, version)
+
+    def matches(self, graph, version=None):
+        return graph is self.graph and version == self.version
+
+    def __contains__(self, node_id):
+        return node_id in self.index
+
+    def _condense(self):
+        # kosaraju, the nodes on a cycle share a component
+        n = len(self.nodes)
+        order = []
+        visited = bytearray(n)
+        for start in range(n):
+            if visited[start]:
+                continue
+            visited[start] = 1
+            stack = [(start, iter(self.successors[start]))]
+            while stack:
+                i, succs = stack[-1]
+                for j in succs:
+                    if not visited[j]:
+                        visited[j] = 1
+                        stack.append((j, iter(self.successors[j])))
+                        break
+                else:
+                    stack.pop()
+                    order.append(i)
+
+        components = [-1] * n
+        members = []
+        for start in reversed(order):
+            if components[start] != -1:
+                continue
+            c = len(members)
+            components[start] = c
+            group = [start]
+            stack = [start]
+            while stack:
+                i = stack.pop()
+                for j in self.predecessors[i]:
+                    if components[j] == -1:
+                        components[j] = c
+                        group.append(j)
+                        stack.append(j)
+            members.append(group)
+        return components, members
+
+    def _closures(self, neighbours):
+        # components are numbered in dfs postorder along the walk direction, so
+        # the part of a closure that is a dfs subtree is one contiguous range
+        # and every closure is kept as a few half open [lo, hi) ranges
+        count = len(self.members)
+        edges = [set() for _ in range(count)]
+        for c, group in enumerate(self.members):
+            for i in group:
+                for j in neighbours[i]:
+                    if self.components[j] != c:
+                        edges[c].add(self.components[j])
+
+        position = [-1] * count
+        order = []
+        for start in range(count):
+            if position[start] != -1:
+                continue
+            position[start] = 0
+            stack = [(start, iter(edges[start]))]
+            while stack:
+                c, cs = stack[-1]
+                for d in cs:
+                    if position[d] == -1:
+                        position[d] = 0
+                        stack.append((d, iter(edges[d])))
+                        break
+                else:
+                    stack.pop()
+                    position[c] = len(order)
+                    order.append(c)
+
+        # the nodes of every component laid out in position order, a range of
+        # positions maps to one slice of them
+        offsets = array('q', [0])
+        nodes = []
+        for c in order:
+            nodes.extend(self.nodes[i] for i in self.members[c])
+            offsets.append(len(nodes))
+
+        closures = [None] * count
+        for c in order:
+            ranges = []
+            for d in edges[c]:
+                p = position[d]
+                ranges.append((p, p + 1))
+                if closures[d] is not None:
+                    ranges.extend(zip(closures[d][::2], closures[d][1::2]))
+            if not ranges:
+                continue
+            ranges.sort()
+            merged = array('q', ranges[0])
+            for lo, hi in ranges[1:]:
+                if lo <= merged[-1]:
+                    if hi > merged[-1]:
+                        merged[-1] = hi
+                else:
+                    merged.append(lo)
+                    merged.append(hi)
+            closures[c] = merged
+        return position, offsets, nodes, closures
+
+    def _upstream(self):
+        if self.upstream is None:
+            self.upstream = self._closures(self.predecessors)
+        return self.upstream
+
+    def _downstream(self):
+        if self.downstream is None:
+            self.downstream = self._closures(self.successors)
+        return self.downstream
+
+    def _reachable(self, node_id, closures):
+        _, offsets, nodes, ranges = closures
+        i = self.index[node_id]
+        c = self.components[i]
+        # nodes on a cycle reach each other, like nx.ancestors the node itself is left out
+        reached = {self.nodes[j] for j in self.members[c] if j != i} if len(self.members[c]) > 1 else set()
+        if ranges[c] is not None:
+            for lo, hi in zip(ranges[c][::2], ranges[c][1::2]):
+                reached.update(nodes[offsets[lo]:offsets[hi]])
+        return reached
+
+    def ancestors(self, node_id):
+        return self._reachable(node_id, self._upstream())
+
+    def descendants(self, node_id):
+        return self._reachable(node_id, self._downstream())
+
+    def is_upstream(self, src_id, dest_id):
+        c_src = self.components[self.index[src_id]]
+        c_dest = self.components[self.index[dest_id]]
+        if c_src == c_dest:
+            return src_id != dest_id
+        position, _, _, ranges = self._upstream()
+        if ranges[c_dest] is None:
+            return False
+        # inside a range when an odd number of bounds are at or below the position
+        return bisect_right(ranges[c_dest], position[c_src]) % 2 == 1
@@ -0,0 +1,48 @@
+import re
+
+# comments and string literals can not reference tables, so they are blanked
+# out before identifiers are collected
+IGNORED = re.compile(r"--[^\n]*|/\*.*?\*/|'(?:[^']|'')*'", re.DOTALL)
+PART = r'(?:"[^"]+"|`[^`]+`|\[[^\]]+\]|[A-Za-z_][\w$]*)'
+REFERENCE = re.compile(rf'{PART}(?:\s*\.\s*{PART})*')
+QUOTES = '"`[]'
+
+
+class ReferenceScanner():
+    def __init__(self, table_ids, *, db=None, catalog=None):
+        # matching is case insensitive, a false match only costs an extra model
+        self.table_ids = {}
+        for table_id in table_ids:
+            self.table_ids.setdefault(table_id.lower(), []).append(table_id)
+            # models traced with a db and catalog are referenced by their qualified names
+            if db:
+                self.table_ids.setdefault(f'{db}.{table_id}'.lower(), []).append(table_id)
+                if catalog:
+                    self.table_ids.setdefault(f'{catalog}.{db}.{table_id}'.lower(), []).append(table_id)
+
+    def references(self, sql):
+        refs = set()
+        for match in REFERENCE.finditer(IGNORED.sub(' ', sql)):
+            parts = [p.strip().strip(QUOTES).lower() for p in match.group(0).split('.')]
+            # a qualified column also references its table, so every prefix counts
+            for i in range(1, len(parts) + 1):
+                refs.update(self.table_ids.get('.'.join(parts[:i]), []))
+        return refs
+
+    def closure(self, table_ids, read, *, excluded=None):
+        # read returns the sql for a table id, it is called once per model in the closure
+        excluded = set(excluded or [])
+        visited = []
+        stack = [table_id for table_id in reversed(list(table_ids)) if table_id not in excluded]
+        seen = set(stack)
+        while stack:
+            table_id = stack.pop()
+            visited.append(table_id)
+            sql = read(table_id)
+            if sql is None:
+                continue
+            for ref in sorted(self.references(sql)):
+                if ref not in seen and ref not in excluded:
+                    seen.add(ref)
+                    stack.append(ref)
+        return visited
@@ -1,4 +1,6 @@
 from sqlgraph.model import Table
+from collections import OrderedDict
+import threading
 import abc
 
 class Schema(object):
@@ -27,6 +29,66 @@ class DictSchema(Schema):
             raise ValueError(f'matched multiple tables for {catalog}.{db}.{table}: {[str(m) for m in matches]}')
         return matches[0] if matches else None
 
-            
 
-    
\ No newline at end of file
+class TableResolver(Schema):
+    def __init__(self, schema, *, max_size=10000):
+        self.schema = schema
+        self.max_size = max_size
+        self.tables = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        
+    @staticmethod
+    def key(table, db=None, catalog=None):
+        return (catalog or None, db or None, table)
+        
+    def get_table(self, table, db=None, catalog=None):
+        key = TableResolver.key(table, db, catalog)
+        with self.lock:
+            if key in self.tables:
+                self.tables.move_to_end(key)
+                self.hits += 1
+                return self.tables[key]
+            self.misses += 1
+        
+        # misses are cached as None, lookup errors are not cached at all
+        tbl = self.schema.get_table(table, db, catalog)
+        with self.lock:
+            self.tables[key] = tbl
+            self.tables.move_to_end(key)
+            while self.max_size is not None and len(self.tables) > self.max_size:
+                self.tables.popitem(last=False)
+                self.evictions += 1
+        return tbl
+    
+    def invalidate(self, table=None, db=None, catalog=None):
+        with self.lock:
+            if table is None:
+                self.tables.clear()
+                return
+            for key in list(self.tables.keys()):
+                if key[2] == table and (db is None or key[1] in (None, db)) and (catalog is None or key[0] in (None, catalog)):
+                    del self.tables[key]
+    
+    def clear(self):
+        self.invalidate()
+        
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self.tables)
+        }
+    
+    def __getstate__(self):
+        # workers get their own lock
+        state = dict(self.__dict__)
+        del state['lock']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
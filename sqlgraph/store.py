@@ -0,0 +1,199 @@
+import sys
+from array import array
+from collections.abc import Mapping
+from networkx.classes.digraph import DiGraph
+
+# attributes are stored by column, nodes without a value hold this marker
+MISSING = object()
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) == str else value
+
+
+class GraphStore():
+    def __init__(self, nodes, node_attributes, out_offsets, out_targets, in_offsets, in_sources, in_edges, edge_attributes):
+        self.nodes = nodes
+        self.index = {node_id: i for i, node_id in enumerate(nodes)}
+        self.node_attributes = node_attributes
+        # CSR: the out edges of node i are out_targets[out_offsets[i]:out_offsets[i+1]]
+        self.out_offsets = out_offsets
+        self.out_targets = out_targets
+        # CSC: in_edges maps every in edge back to its position in the CSR arrays
+        self.in_offsets = in_offsets
+        self.in_sources = in_sources
+        self.in_edges = in_edges
+        self.edge_attributes = edge_attributes
+
+    @classmethod
+    def from_networkx(cls, g):
+        nodes = [_intern(node_id) for node_id in g.nodes]
+        index = {node_id: i for i, node_id in enumerate(nodes)}
+
+        node_attributes = {}
+        for i, node_id in enumerate(nodes):
+            for k, v in g.nodes[node_id].items():
+                column = node_attributes.get(k)
+                if column is None:
+                    column = node_attributes[k] = [MISSING] * len(nodes)
+                column[i] = _intern(v)
+
+        out_offsets = array('q', [0])
+        out_targets = array('q')
+        edge_attributes = {}
+        in_degrees = [0] * len(nodes)
+        edge_count = g.number_of_edges()
+        for node_id in nodes:
+            for succ_id, attrs in g.succ[node_id].items():
+                e = len(out_targets)
+                j = index[succ_id]
+                out_targets.append(j)
+                in_degrees[j] += 1
+                for k, v in attrs.items():
+                    column = edge_attributes.get(k)
+                    if column is None:
+                        column = edge_attributes[k] = [MISSING] * edge_count
+                    column[e] = _intern(v)
+            out_offsets.append(len(out_targets))
+
+        in_offsets = array('q', [0])
+        for degree in in_degrees:
+            in_offsets.append(in_offsets[-1] + degree)
+        in_sources = array('q', [0]) * len(out_targets)
+        in_edges = array('q', [0]) * len(out_targets)
+        positions = array('q', in_offsets[:-1])
+        for i in range(len(nodes)):
+            for e in range(out_offsets[i], out_offsets[i + 1]):
+                j = out_targets[e]
+                in_sources[positions[j]] = i
+                in_edges[positions[j]] = e
+                positions[j] += 1
+
+        return cls(nodes, node_attributes, out_offsets, out_targets, in_offsets, in_sources, in_edges, edge_attributes)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, node_id):
+        return node_id in self.index
+
+    def number_of_edges(self):
+        return len(self.out_targets)
+
+    def node(self, node_id):
+        i = self.index[node_id]
+        return {k: column[i] for k, column in self.node_attributes.items() if column[i] is not MISSING}
+
+    def edge(self, e):
+        return {k: column[e] for k, column in self.edge_attributes.items() if column[e] is not MISSING}
+
+    def set_node_attribute(self, node_id, key, value):
+        column = self.node_attributes.get(key)
+        if column is None:
+            column = self.node_attributes[key] = [MISSING] * len(self.nodes)
+        column[self.index[node_id]] = value
+
+    def iter_attribute(self, key):
+        column = self.node_attributes.get(key)
+        if column is None:
+            return
+        for i, value in enumerate(column):
+            if value is not MISSING:
+                yield self.nodes[i], value
+
+    def successors(self, node_id):
+        i = self.index[node_id]
+        return [self.nodes[j] for j in self.out_targets[self.out_offsets[i]:self.out_offsets[i + 1]]]
+
+    def predecessors(self, node_id):
+        i = self.index[node_id]
+        return [self.nodes[j] for j in self.in_sources[self.in_offsets[i]:self.in_offsets[i + 1]]]
+
+    def _walk(self, node_id, offsets, targets):
+        start = self.index[node_id]
+        seen = {start}
+        stack = [start]
+        while stack:
+            i = stack.pop()
+            for j in targets[offsets[i]:offsets[i + 1]]:
+                if j not in seen:
+                    seen.add(j)
+                    stack.append(j)
+        seen.discard(start)
+        return {self.nodes[i] for i in seen}
+
+    def ancestors(self, node_id):
+        return self._walk(node_id, self.in_offsets, self.in_sources)
+
+    def descendants(self, node_id):
+        return self._walk(node_id, self.out_offsets, self.out_targets)
+
+    def subgraph(self, node_ids):
+        # nodes keep the order they are given in, like a networkx subgraph
+        g = DiGraph()
+        indexes = [self.index[node_id] for node_id in node_ids]
+        for i in indexes:
+            g.add_node(self.nodes[i], **self.node(self.nodes[i]))
+        included = set(indexes)
+        for i in indexes:
+            for e in range(self.out_offsets[i], self.out_offsets[i + 1]):
+                if self.out_targets[e] in included:
+                    g.add_edge(self.nodes[i], self.nodes[self.out_targets[e]], **self.edge(e))
+        return g
+
+    def to_networkx(self):
+        return self.subgraph(self.nodes)
+
+
+class StoreNodes(Mapping):
+    # node id -> attributes over a store, read only and shaped like the dicts
+    # of a networkx graph so the networkx views can filter it
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, node_id):
+        return self.store.node(node_id)
+
+    def __iter__(self):
+        return iter(self.store.nodes)
+
+    def __len__(self):
+        return len(self.store.nodes)
+
+    def __contains__(self, node_id):
+        return node_id in self.store.index
+
+
+class StoreAdjacency(StoreNodes):
+    # node id -> neighbour id -> edge attributes, the out edges or the in edges
+    def __init__(self, store, successors):
+        super().__init__(store)
+        self.successors = successors
+
+    def __getitem__(self, node_id):
+        store = self.store
+        i = store.index[node_id]
+        if self.successors:
+            edges = {store.nodes[store.out_targets[e]]: e for e in range(store.out_offsets[i], store.out_offsets[i + 1])}
+        else:
+            edges = {store.nodes[store.in_sources[p]]: store.in_edges[p] for p in range(store.in_offsets[i], store.in_offsets[i + 1])}
+        return StoreNeighbours(store, edges)
+
+
+class StoreNeighbours(Mapping):
+    # edge attributes are only read for the neighbours that are looked up
+    def __init__(self, store, edges):
+        self.store = store
+        self.edges = edges
+
+    def __getitem__(self, node_id):
+        return self.store.edge(self.edges[node_id])
+
+    def __iter__(self):
+        return iter(self.edges)
+
+    def __len__(self):
+        return len(self.edges)
+
+    def __contains__(self, node_id):
+        return node_id in self.edges
@@ -1,20 +1,146 @@
 from sqlgraph.graph import SqlGraph
-from sqlglot import parse_one, exp
+from sqlglot import parse, exp
 import os
+import sys
+import pickle
 import logging
 import json
 from sqlgraph import model as mdl
 from uuid import uuid4
 from sqlgraph.model import CompositeSource
+from sqlgraph.cache import ParseCache
+from sqlgraph.loader import SqlLoader
+from sqlgraph.profile import TraceProfile
+from sqlgraph.scan import ReferenceScanner
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from contextlib import contextmanager
+from collections.abc import Mapping
 
 _type = type
 
 logger = logging.getLogger(__name__)
 
+_worker_tracer = None
+
+SNAPSHOT_RECURSION_LIMIT = 100000
+
+
+def _init_worker(sqls, dialect, schema, tracers, parse_cache, profile):
+    global _worker_tracer
+    _worker_tracer = (sqls, dialect, schema, tracers, parse_cache, profile)
+    
+
+def _get_dependencies(table_ids):
+    sqls, dialect, schema, tracers, parse_cache, profile = _worker_tracer
+    tracer = SqlTrace.Tracer(sqls, dialect=dialect, schema=schema, tracers=tracers, parse_cache=parse_cache)
+    dependencies = {}
+    for table_id in table_ids:
+        try:
+            statements = tracer.parse(sqls[table_id])
+        except Exception as ex:
+            raise ValueError(f'Error parsing sql for {table_id}') from ex
+        dependencies[table_id] = tracer.get_referenced_tables(statements, table_id)
+    return dependencies
+
+
+def _trace_tables(table_ids, upstream):
+    sqls, dialect, schema, tracers, parse_cache, profile = _worker_tracer
+    tracer = SqlTrace.Tracer(sqls, dialect=dialect, schema=schema, tracers=tracers, parse_cache=parse_cache, profile=profile)
+    tracer.traced_tables.update(upstream)
+    for table_id in table_ids:
+        try:
+            tracer.get_traced_table(table_id)
+        except Exception as ex:
+            raise ValueError(f'Error parsing sql for {table_id}') from ex
+    tables = {table_id: tracer.traced_tables[table_id] for table_id in table_ids}
+    return tables, tracer.lookups, tracer.profile.to_dict() if tracer.profile else None
+
+
+@contextmanager
+def _recursion_limit(limit):
+    # source trees of deep model chains nest far deeper than the default limit
+    previous = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(previous, limit))
+    try:
+        yield
+    finally:
+        sys.setrecursionlimit(previous)
+
+
+def _chunks(items, n):
+    size = max(1, -(-len(items) // n))
+    return [items[i:i+size] for i in range(0, len(items), size)]
+
+
+class Scope():
+    def __init__(self, select, sources, ctes):
+        self.select = select
+        self.sources = sources
+        self.ctes = ctes
+        self.columns = {}
+        self.pending = None
+
+
+class LazyTables(Mapping):
+    def __init__(self, tracer):
+        self.tracer = tracer
+        
+    def __getitem__(self, table_id):
+        if table_id not in self.tracer.sqls:
+            raise KeyError(table_id)
+        try:
+            return self.tracer.get_traced_table(table_id)
+        except Exception as ex:
+            raise ValueError(f'Error parsing sql for {table_id}') from ex
+    
+    def __contains__(self, table_id):
+        return table_id in self.tracer.sqls
+    
+    def __iter__(self):
+        return iter(list(self.tracer.sqls.keys()))
+    
+    def __len__(self):
+        return len(self.tracer.sqls)
+
+
+class LazySources(Mapping):
+    def __init__(self, tracer, sources, selects):
+        self.tracer = tracer
+        self.sources = sources
+        self.selects = {name: e for name, e in selects if name != '*'}
+        self.order = list(sources.keys()) + [name for name in self.selects if name not in sources]
+        # columns are traced later, under the model that declared them
+        self.context = tracer.parsing_context[-1] if tracer.parsing_context else None
+        
+    def __getitem__(self, column):
+        if column in self.selects:
+            context = self.tracer.parsing_context
+            pushed = self.context is not None and (not context or context[-1] is not self.context)
+            if pushed:
+                context.append(self.context)
+            try:
+                self.sources[column] = self.tracer.interner.intern(self.tracer.trace(self.selects[column]))
+            finally:
+                if pushed:
+                    context.pop()
+            del self.selects[column]
+        return self.sources[column]
+    
+    def __contains__(self, column):
+        return column in self.selects or column in self.sources
+    
+    def __iter__(self):
+        return iter(self.order)
+    
+    def __len__(self):
+        return len(self.order)
+
 
 class SqlTrace():
-    def __init__(self, tables):
+    def __init__(self, tables, tracer=None):
         self.tables = tables
+        self.tracer = tracer
         
     # @property
     # def tables(self):
@@ -26,6 +152,99 @@ class SqlTrace():
     def to_graph(self, **kwargs):
         return SqlGraph(self.tables, **kwargs)
     
+    def update(self, sqls, *, graph=None):
+        if not self.tracer:
+            raise ValueError('update requires a trace created by trace_sql')
+        if self.tracer.target_columns is not None:
+            raise ValueError('update is not supported for column traces')
+        
+        # changed models and everything downstream of them get traced again
+        dependents = {}
+        for table_id, deps in self.tracer.dependencies.items():
+            for dep in deps:
+                dependents.setdefault(dep, set()).add(table_id)
+        
+        # a lazy trace only re-traces what was already traced, the rest stays on demand
+        lazy = isinstance(self.tables, LazyTables)
+        if lazy:
+            order = list(self.tracer.traced_tables.keys())
+        else:
+            order = list(self.tables.keys()) + [table_id for table_id in sqls if table_id not in self.tables]
+        affected = set()
+        stack = list(sqls.keys())
+        # models that looked up the name of an added or removed model may now
+        # resolve it differently, a model can shadow a schema table
+        names = {
+            mdl.Table.from_id(table_id).name for table_id, sql in sqls.items()
+            if sql is None or table_id not in self.tracer.sqls
+        }
+        stack.extend(table_id for table_id, looked_up in self.tracer.lookups.items() if looked_up & names)
+        while stack:
+            table_id = stack.pop()
+            if table_id not in affected:
+                affected.add(table_id)
+                stack.extend(dependents.get(table_id, []))
+        
+        for table_id, sql in sqls.items():
+            if sql is None:
+                self.tracer.sqls.pop(table_id, None)
+            else:
+                self.tracer.sqls[table_id] = sql
+        self.tracer.invalidate(affected)
+        
+        retraced = []
+        for table_id in order:
+            if table_id in affected and table_id in self.tracer.sqls and table_id not in retraced:
+                try:
+                    self.tracer.get_traced_table(table_id)
+                except Exception as ex:
+                    raise ValueError(f'Error parsing sql for {table_id}') from ex
+                retraced.append(table_id)
+        
+        if not lazy:
+            tables = {}
+            for table_id in order + list(self.tracer.traced_tables.keys()):
+                if table_id in self.tracer.traced_tables:
+                    tables[table_id] = self.tracer.traced_tables[table_id]
+            self.tables = tables
+        
+        if graph is not None:
+            graph.replace_tables(
+                [table_id for table_id in affected if table_id not in self.tables],
+                [
+                    self.tracer.traced_tables[table_id] 
+                    for table_id in order + retraced 
+                    if table_id in affected and table_id in self.tracer.traced_tables
+                ]
+            )
+        return retraced
+    
+    SNAPSHOT_MAGIC = b'SQLGRAPH'
+    SNAPSHOT_VERSION = 1
+    
+    def save(self, path):
+        # only the traced tables are kept, shared Table references survive
+        # because pickle writes every object once
+        tables = dict(self.tables)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(SqlTrace.SNAPSHOT_MAGIC + bytes([SqlTrace.SNAPSHOT_VERSION]))
+            with _recursion_limit(SNAPSHOT_RECURSION_LIMIT):
+                pickle.dump({'tables': tables}, f, protocol=5)
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            header = f.read(len(SqlTrace.SNAPSHOT_MAGIC) + 1)
+            if header[:-1] != SqlTrace.SNAPSHOT_MAGIC:
+                raise ValueError(f'{path} is not a trace snapshot')
+            if header[-1] != SqlTrace.SNAPSHOT_VERSION:
+                raise ValueError(f'unsupported trace snapshot version {header[-1]} in {path}')
+            with _recursion_limit(SNAPSHOT_RECURSION_LIMIT):
+                snapshot = pickle.load(f)
+        return SqlTrace(snapshot['tables'])
+    
     def __str__(self):
         s = ''
         for table, table_source in self.tables.items():
@@ -39,12 +258,42 @@ class SqlTrace():
 
         
     @classmethod
-    def trace_sql(cls, sql, name=None, *, models=None, excluded_models=None, dialect=None, schema=None, db=None, catalog=None, tracers=None):
+    def trace_sql(cls, sql, name=None, *, models=None, excluded_models=None, include_upstream=False, dialect=None, schema=None, db=None, catalog=None, tracers=None, workers=None, parse_cache=None, lazy=False, profile=None, columns=None):
+        sql = cls.filter_sql(sql, name, models=models, excluded_models=excluded_models, include_upstream=include_upstream, db=db, catalog=catalog)
+        if columns is not None:
+            if lazy or (workers and workers > 1):
+                raise ValueError('columns cannot be combined with lazy or parallel tracing')
+            if type(columns) != dict:
+                columns = {table_id: list(columns) for table_id in sql}
+            elif db or catalog:
+                columns = {
+                    (k if k in sql else mdl.Table.get_id(k, db, catalog)): v
+                    for k, v in columns.items()
+                }
+        tracer = cls.Tracer(sql, dialect=dialect, schema=schema, tracers=tracers, parse_cache=parse_cache, profile=profile, columns=columns)
+        if lazy:
+            return SqlTrace(LazyTables(tracer), tracer)
+        tables = tracer.trace_sql(workers=workers)
+        return SqlTrace(tables, tracer)
+    
+    @classmethod
+    def iter_trace(cls, sql, name=None, *, models=None, excluded_models=None, include_upstream=False, dialect=None, schema=None, db=None, catalog=None, tracers=None, parse_cache=None, profile=None):
+        sql = cls.filter_sql(sql, name, models=models, excluded_models=excluded_models, include_upstream=include_upstream, db=db, catalog=catalog)
+        tracer = cls.Tracer(sql, dialect=dialect, schema=schema, tracers=tracers, parse_cache=parse_cache, profile=profile)
+        return tracer.iter_trace()
+    
+    @classmethod
+    def filter_sql(cls, sql, name=None, *, models=None, excluded_models=None, include_upstream=False, db=None, catalog=None):
         if type(sql) == str:
             if not name:
                 raise ValueError('name is required for single SQL statement')
             else:
                 sql = {name: sql}
+        
+        # requested models pull in every model they reference, found by a scan
+        # of the sql before anything is parsed
+        if include_upstream and models is not None:
+            models = set(ReferenceScanner(sql.keys(), db=db, catalog=catalog).closure(models, sql.get, excluded=excluded_models))
                 
         filtered = {}
         for model, sql in sql.items():
@@ -62,9 +311,7 @@ class SqlTrace():
                 mdl.Table.get_id(name, db, catalog): s
                 for name, s in sql.items()
             }
-                
-        tables = cls.Tracer(sql, dialect=dialect, schema=schema, tracers=tracers).trace_sql()
-        return SqlTrace(tables)
+        return sql
         
     @classmethod
     def trace_file(cls, file, *, name=None, **kwargs):
@@ -75,37 +322,67 @@ class SqlTrace():
         return cls.trace_sql({name: sql}, **kwargs)
     
     @classmethod
-    def trace_directory(cls, directory, **kwargs):
-        sqls = {}
-        for root, dirs, files in os.walk(directory):
-            for file in files:
-                model = file[0:-4]
-                
-                with open(os.path.join(root, file)) as f:
-                    sql = f.read()
-                sqls[model] = sql
-                    
-        return cls.trace_sql(sqls, **kwargs)
+    def trace_directory(cls, directory, *, include=None, exclude=None, extensions=['.sql'], io_workers=8, mmap_threshold=None, **kwargs):
+        loader = SqlLoader.get(
+            directory, 
+            include=include, 
+            exclude=exclude, 
+            extensions=extensions, 
+            workers=io_workers, 
+            mmap_threshold=mmap_threshold
+        )
+        
+        # only read the files that survive the model filters
+        models = loader.models()
+        if kwargs.get('models') is not None and kwargs.get('include_upstream'):
+            index = loader.index()
+            sqls = {}
+            
+            def read(model):
+                if model in index and model not in sqls:
+                    sqls[model] = loader.read_file(index[model])
+                return sqls.get(model)
+            
+            kwargs['models'] = ReferenceScanner(models, db=kwargs.get('db'), catalog=kwargs.get('catalog')).closure(kwargs['models'], read, excluded=kwargs.get('excluded_models'))
+            kwargs['include_upstream'] = False
+            return cls.trace_sql(sqls, **kwargs)
+        elif kwargs.get('models') is not None:
+            models = [model for model in models if model in kwargs['models']]
+        elif kwargs.get('excluded_models'):
+            models = [model for model in models if model not in kwargs['excluded_models']]
+        return cls.trace_sql(loader.read(models), **kwargs)
     
     @classmethod
-    def list_models(cls, directory):
-        models = []
-        for root, dirs, files in os.walk(directory):
-            for file in files:
-                models.append(file[0:-4])
-        return models
+    def list_models(cls, directory, **kwargs):
+        return SqlLoader.get(directory, **kwargs).models()
     
     class Tracer():
         
-        def __init__(self, sqls, *, dialect=None, schema=None, tracers=None):
+        def __init__(self, sqls, *, dialect=None, schema=None, tracers=None, parse_cache=None, profile=None, columns=None):
+            if type(parse_cache) == str:
+                parse_cache = ParseCache(parse_cache)
+            if profile is True:
+                profile = TraceProfile()
+            self.profile = profile or None
             self.sqls = sqls
+            self.parse_cache = parse_cache
             self.schema = schema
             self.column_cache = {}
             self.tracers = tracers or {}
-            self.unique_names = []
+            self.handlers = {}
+            self.default_handlers = {}
+            self.unique_names = {}
+            self.interner = mdl.SourceInterner()
+            self.structure_cache = {}
+            self.scopes = {}
             self.traced_tables = {}
+            self.completed = []
+            self.dependencies = {}
+            # every table name a model looked up, whether it resolved or not
+            self.lookups = {}
             self.dialect = dialect
             self.parsing_context = []
+            self.target_columns = columns
             
         def get_traced_table(self, table_id):
             if table_id not in self.sqls:
@@ -114,37 +391,250 @@ class SqlTrace():
             if table_id not in self.traced_tables:
                 self.parsing_context.append({'table_id': table_id, 'unique_idx': 0})
                 s = self.sqls[table_id]
-                t = parse_one(s, dialect=self.dialect)
-                qualified_table = mdl.Table.from_id(table_id)
-                tbl = self.trace_table(t, qualified_table.name)
+                if self.profile:
+                    start = self.profile.start()
+                    try:
+                        statements = self.parse(s)
+                        qualified_table = mdl.Table.from_id(table_id)
+                        tbl = self.trace_statements(statements, qualified_table.name)
+                    finally:
+                        self.profile.record_model(table_id, start)
+                else:
+                    statements = self.parse(s)
+                    qualified_table = mdl.Table.from_id(table_id)
+                    tbl = self.trace_statements(statements, qualified_table.name)
                 tbl.db = qualified_table.db
                 tbl.catalog = qualified_table.catalog
                 self.traced_tables[table_id] = tbl
+                self.completed.append(table_id)
                 self.parsing_context.pop()
+                if not self.parsing_context and self.target_columns is None:
+                    self.structure_cache.clear()
+                    self.scopes.clear()
             return self.traced_tables[table_id]
+        
+        
+        def parse(self, sql):
+            # scripts are parsed in one pass, empty statements are dropped
+            if self.parse_cache:
+                if self.profile:
+                    hits = self.parse_cache.hits
+                    statements = self.parse_cache.parse(sql, self.dialect)
+                    self.profile.record_cache('parse_cache', self.parse_cache.hits > hits)
+                else:
+                    statements = self.parse_cache.parse(sql, self.dialect)
+            else:
+                statements = parse(sql, dialect=self.dialect)
+            statements = [statement for statement in statements if statement is not None]
+            if not statements:
+                raise ValueError('no statements to trace')
+            return statements
+            
             
+        def trace_sql(self, workers=None):
+            if workers and workers > 1:
+                return self.trace_sql_parallel(workers)
+            if self.target_columns is not None:
+                return self.trace_columns(self.target_columns)
             
-        def trace_sql(self):
             for table_id in self.sqls.keys():
                 try:
                     self.get_traced_table(table_id)
                 except Exception as ex:
                     raise ValueError(f'Error parsing sql for {table_id}')
             return self.traced_tables
+        
+        
+        def trace_columns(self, columns):
+            # select lists are traced on demand, so only the requested columns
+            # and whatever they reference upstream are ever traced
+            needed = {}
+            stack = []
+            for table_id, table_columns in columns.items():
+                try:
+                    tbl = self.get_traced_table(table_id)
+                except Exception as ex:
+                    raise ValueError(f'Error parsing sql for {table_id}') from ex
+                if tbl is None:
+                    raise ValueError(f'unknown model {table_id}')
+                for c in table_columns:
+                    if c not in tbl.sources:
+                        raise ValueError(f'unknown column {c} in {table_id}')
+                needed.setdefault(id(tbl), (tbl, set()))[1].update(table_columns)
+                stack.extend(tbl.sources[c] for c in table_columns)
             
+            while stack:
+                source = stack.pop()
+                if not isinstance(source, mdl.Source):
+                    continue
+                if _type(source) == mdl.ColumnSource and _type(source.table) == mdl.TableSource:
+                    tbl = source.table
+                    traced = needed.setdefault(id(tbl), (tbl, set()))[1]
+                    if source.column not in traced and source.column in tbl.sources:
+                        traced.add(source.column)
+                        stack.append(tbl.sources[source.column])
+                stack.extend(source.children())
             
-        def get_unique_name(self, e):
-            name = None
-            for k, v in self.unique_names:
-                if k == e:
-                    name = v
+            # every table keeps only the columns that were reached
+            for tbl, traced in needed.values():
+                tbl.sources = {c: tbl.sources[c] for c in tbl.columns if c in traced}
+                tbl.columns = list(tbl.sources.keys())
+            self.structure_cache.clear()
+            self.scopes.clear()
+            return {table_id: self.traced_tables[table_id] for table_id in columns}
+        
+        
+        def iter_trace(self):
+            for table_id in self.sqls.keys():
+                try:
+                    self.get_traced_table(table_id)
+                except Exception as ex:
+                    raise ValueError(f'Error parsing sql for {table_id}') from ex
+                
+                # upstream models finish first, so completion order is dependency order
+                completed, self.completed = self.completed, []
+                for traced_id in completed:
+                    yield traced_id, self.release_table(traced_id)
+                # released tables must not be kept alive through shared sources
+                self.interner.clear()
+        
+        
+        def release_table(self, table_id):
+            # keep only the column signature so later models can still resolve
+            # the table, and let the caller own the traced TableSource
+            tbl = self.traced_tables[table_id]
+            signature = self.get_table_signature(tbl)
+            self.traced_tables[table_id] = signature
+            for key, cached in self.column_cache.items():
+                if cached is tbl:
+                    self.column_cache[key] = signature
+            return tbl
+        
+        
+        def trace_sql_parallel(self, workers):
+            # models are traced level by level in dependency order.  workers
+            # only receive column signatures of upstream models, the full
+            # TableSources are linked back together once every level is done
+            table_ids = list(self.sqls.keys())
+            profile = True if self.profile else None
+            initargs = (self.sqls, self.dialect, self.schema, self.tracers, self.parse_cache, profile)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+                dependencies = {}
+                for deps in pool.map(_get_dependencies, _chunks(table_ids, workers * 4)):
+                    dependencies.update(deps)
+                
+                traced = {}
+                for level in self.get_trace_levels(dependencies):
+                    tasks = []
+                    for chunk in _chunks(level, workers * 4):
+                        upstream = {
+                            dep: self.get_table_signature(traced[dep])
+                            for table_id in chunk
+                            for dep in dependencies[table_id]
+                            if dep in traced
+                        }
+                        tasks.append(pool.submit(_trace_tables, chunk, upstream))
+                    for task in tasks:
+                        tables, lookups, profile = task.result()
+                        traced.update(tables)
+                        self.lookups.update(lookups)
+                        if profile:
+                            self.profile.merge(profile)
+            
+            self.relink_tables(traced)
+            for table_id, deps in dependencies.items():
+                self.dependencies.setdefault(table_id, set()).update(deps)
+            
+            # same order a serial run adds them in: upstream models first
+            def visit(table_id):
+                if table_id in self.traced_tables or table_id in visiting:
+                    return
+                visiting.add(table_id)
+                for dep in dependencies[table_id]:
+                    visit(dep)
+                self.traced_tables[table_id] = traced[table_id]
+                
+            visiting = set()
+            for table_id in table_ids:
+                visit(table_id)
+            return self.traced_tables
+        
+        
+        def get_referenced_tables(self, statements, table_id=None):
+            if not _type(statements) == list:
+                statements = [statements]
+            script_tables = {
+                self.get_table_id(target) 
+                for target, query in map(self.get_statement_query, statements) 
+                if target is not None
+            }
+            refs = []
+            for t in statements:
+                cte_names = {cte.alias_or_name for cte in t.find_all(exp.CTE)}
+                for table in t.find_all(exp.Table):
+                    if not table.db and table.name in cte_names:
+                        continue
+                    ref_id = self.get_table_id(table)
+                    if ref_id in script_tables:
+                        continue
+                    if ref_id in self.sqls and ref_id != table_id and ref_id not in refs:
+                        refs.append(ref_id)
+            return refs
+        
+        
+        def get_trace_levels(self, dependencies):
+            remaining = {table_id: set(deps) for table_id, deps in dependencies.items()}
+            levels = []
+            while remaining:
+                level = [table_id for table_id, deps in remaining.items() if not deps]
+                if not level:
+                    # cyclic references, let the workers resolve them recursively
+                    levels.append(list(remaining.keys()))
                     break
+                for table_id in level:
+                    del remaining[table_id]
+                for deps in remaining.values():
+                    deps.difference_update(level)
+                levels.append(level)
+            return levels
+        
+        
+        def get_table_signature(self, tbl):
+            return mdl.Table(tbl.name, list(tbl.columns), db=tbl.db, catalog=tbl.catalog, type=tbl.type)
+        
+        
+        def relink_tables(self, tables):
+            schema_tables = {}
+            visited = set()
+            stack = [s for t in tables.values() for s in t.sources.values()]
+            while stack:
+                source = stack.pop()
+                if not isinstance(source, mdl.Source) or id(source) in visited:
+                    continue
+                visited.add(id(source))
                 
+                if _type(source) == mdl.ColumnSource and isinstance(source.table, mdl.Table):
+                    table = source.table
+                    if table.id in tables:
+                        source.table = tables[table.id]
+                    elif _type(table) == mdl.TableSource:
+                        if id(table) not in visited:
+                            visited.add(id(table))
+                            stack.extend(table.sources.values())
+                    else:
+                        source.table = schema_tables.setdefault(table.id, table)
+                stack.extend(source.children())
+            
+            
+        def get_unique_name(self, e):
+            # expressions hash and compare structurally, so equal subqueries share a name
+            name = self.unique_names.get(e)
             if not name:
                 ctx = self.parsing_context[-1]
                 name = f'{ctx["table_id"]}_{ctx["unique_idx"]}'
                 ctx['unique_idx'] = ctx['unique_idx'] + 1
-                self.unique_names.append([e, name])
+                # a detached copy, so the name does not keep the whole tree alive
+                self.unique_names[e.copy()] = name
             return name
 
         def get_comments(self, tbl):
@@ -192,21 +682,118 @@ class SqlTrace():
             return mappings
                 
         
+        def trace_statements(self, statements, name):
+            if len(statements) == 1 and self.get_statement_query(statements[0])[0] is None:
+                return self.trace_table(statements[0], name)
+            return self.trace_script(statements, name)
+        
+        
+        def get_statement_query(self, statement):
+            # (created or inserted table, query) for statements that produce rows
+            target = None
+            if _type(statement) in [exp.Create, exp.Insert]:
+                target = statement.this
+                if _type(target) == exp.Schema:
+                    target = target.this
+                query = statement.expression
+            else:
+                query = statement
+            
+            while _type(query) == exp.Subquery:
+                query = query.this
+            if not isinstance(query, exp.Query):
+                return None, None
+            return target, query
+        
+        
+        def get_table_id(self, table):
+            return mdl.Table.get_id(table.name, table.db or None, table.catalog or None)
+        
+        
+        def trace_script(self, statements, name):
+            # intermediate tables are traced once into the script table map, later
+            # statements resolve them from there, the last query is the model
+            queries = [
+                (statement, *self.get_statement_query(statement)) 
+                for statement in statements
+            ]
+            queries = [q for q in queries if q[2] is not None]
+            if not queries:
+                raise ValueError(f'no query to trace in {name}')
+            
+            tables = self.parsing_context[-1].setdefault('tables', {}) if self.parsing_context else {}
+            for i, (statement, target, query) in enumerate(queries[:-1]):
+                if target is None:
+                    logger.warning(f'ignored intermediate query in {name}: {query}')
+                    continue
+                table_id = self.get_table_id(target)
+                if _type(statement) == exp.Insert and table_id in tables:
+                    rows = self.trace_table_structure(query, name=f'{name}.temp.{table_id}.insert[{i}]', type='temp')
+                    tables[table_id] = self.append_rows(tables[table_id], rows)
+                else:
+                    tables[table_id] = self.trace_table_structure(query, name=f'{name}.temp.{table_id}', type='temp')
+            
+            return self.trace_table(queries[-1][2], name)
+        
+        
+        def append_rows(self, tbl, rows):
+            # inserted rows map onto the existing columns by position
+            sources = {}
+            for i, c in enumerate(tbl.columns):
+                sources[c] = tbl.sources[c]
+                if i < len(rows.columns):
+                    sources[c] = mdl.UnionSource(sources=[sources[c], mdl.ColumnSource(rows, rows.columns[i])])
+            return mdl.TableSource(tbl.name, sources, type=tbl.type)
+        
+        
         def trace_table(self, tbl, name=None):
             comment_mappings = self.get_comment_mappings(tbl)
             return self.trace_table_structure(tbl, name=name, type='table')
         
          
         def resolve_table(self, t):
-            table_key = f'{t.db}.{t.name}'
+            if self.parsing_context and not t.catalog:
+                script_table = self.parsing_context[-1].get('tables', {}).get(self.get_table_id(t))
+                if script_table is not None:
+                    return script_table
+            
+            table_key = (t.catalog or None, t.db or None, t.name)
+            if self.parsing_context:
+                self.lookups.setdefault(self.parsing_context[-1]['table_id'], set()).add(t.name)
+            if self.profile:
+                self.profile.record_cache('column_cache', table_key in self.column_cache)
             if table_key not in self.column_cache:
                 tbl = self.get_traced_table(mdl.Table(t.name, [], db=t.db or None, catalog=t.catalog or None).id)
                 if not tbl and self.schema:
                     tbl = self.schema.get_table(t.name, t.db or None, t.catalog or None)
                 
                 self.column_cache[table_key] = tbl
-
-            return self.column_cache[table_key]
+            
+            tbl = self.column_cache[table_key]
+            if tbl is not None and self.parsing_context and self.traced_tables.get(tbl.id) is tbl:
+                self.dependencies.setdefault(self.parsing_context[-1]['table_id'], set()).add(tbl.id)
+            return tbl
+        
+        
+        def invalidate(self, table_ids):
+            table_ids = set(table_ids)
+            names = {mdl.Table.from_id(table_id).name for table_id in table_ids}
+            for table_id in table_ids:
+                self.traced_tables.pop(table_id, None)
+                self.dependencies.pop(table_id, None)
+                self.lookups.pop(table_id, None)
+            
+            # drop lookups that pointed at the old tables, or that may now
+            # resolve to a model instead of the schema
+            self.column_cache = {
+                k: v for k, v in self.column_cache.items()
+                if v is not None and v.name not in names
+            }
+            self.unique_names = {
+                e: name for e, name in self.unique_names.items()
+                if name.rsplit('_', 1)[0] not in table_ids
+            }
+            self.interner.clear()
         
          
         def find_direct(self, parent, exp_type):
@@ -230,7 +817,43 @@ class SqlTrace():
            
         
         
+        def get_scope(self, select):
+            # sources and visible CTEs are resolved once per select and shared
+            # by every column in it
+            scope = self.scopes.get(id(select))
+            if scope is None:
+                ctes = {}
+                for cte in self.get_applicable_ctes(select):
+                    ctes.setdefault(cte.alias_or_name, cte)
+                scope = Scope(select, None, ctes)
+                scope.sources = self._get_select_sources(select, scope)
+                self.scopes[id(select)] = scope
+            return scope
+        
+        
+        def get_column_entry(self, select, name):
+            # sources are traced in order only until one has the column, a lateral
+            # source can look up columns of the sources before it in the same scope
+            scope = self.get_scope(select)
+            if scope.pending is None:
+                scope.pending = list(scope.sources.values())
+            while name not in scope.columns and scope.pending:
+                s = scope.pending.pop(0)
+                try:
+                    ts = self.trace_table_structure(s)
+                except Exception as ex:
+                    logger.warning(f'unable to trace source {s}: {ex}')
+                    continue
+                for c in ts.columns:
+                    scope.columns.setdefault(c, (s, ts))
+            return scope.columns.get(name)
+        
+        
         def get_select_sources(self, select):
+            return self.get_scope(select).sources
+        
+        
+        def _get_select_sources(self, select, scope):
             if 'from' not in select.args:
                 parent = select.parent
                 while _type(parent) != exp.Lateral and parent.parent and not parent.same_parent:
@@ -258,10 +881,9 @@ class SqlTrace():
                 source = sources[aon]
                 
                 if type(source.args['this']) == exp.Table and not source.args['this'].db:
-                    for cte in self.get_applicable_ctes(select):
-                        if cte.alias_or_name == source.args['this'].name:
-                            sources[aon] = cte
-                            break
+                    cte = scope.ctes.get(source.args['this'].name)
+                    if cte is not None:
+                        sources[aon] = cte
                             
             return sources
             
@@ -273,6 +895,20 @@ class SqlTrace():
             return source.args['this']
         
         def trace_table_structure(self, t, *, type=None, name=None, select_sources=None):
+            if select_sources is not None:
+                return self._trace_table_structure(t, type=type, name=name, select_sources=select_sources)
+            
+            # every column reference resolves through its select sources, so
+            # each subquery, CTE and table node is only traced once per scope
+            key = (id(t), type, name)
+            cached = self.structure_cache.get(key)
+            if cached is None:
+                # the node is kept with the result so its id cannot be reused
+                cached = (t, self._trace_table_structure(t, type=type, name=name))
+                self.structure_cache[key] = cached
+            return cached[1]
+        
+        def _trace_table_structure(self, t, *, type=None, name=None, select_sources=None):
             if name is None:
                 name = self.get_unique_name(t)
                 
@@ -312,11 +948,14 @@ class SqlTrace():
                     for src in select_sources.values():
                         trc = self.trace_table_structure(src, name=name)
                         for c in trc.columns:
-                            columns[c] = mdl.ColumnSource(trc, c)
+                            columns[c] = self.interner.intern(mdl.ColumnSource(trc, c))
                         
-                for col_name, col_val in zip(t.named_selects, t.selects):
-                    if col_name != '*':
-                        columns[col_name] = self.trace(col_val)
+                if self.target_columns is not None:
+                    columns = LazySources(self, columns, zip(t.named_selects, t.selects))
+                else:
+                    for col_name, col_val in zip(t.named_selects, t.selects):
+                        if col_name != '*':
+                            columns[col_name] = self.interner.intern(self.trace(col_val))
                 
                 if not type:
                     type = 'values' if _type(t) == exp.Values else 'select'
@@ -342,11 +981,13 @@ class SqlTrace():
                 ts = mdl.TableSource(
                     name, 
                     {
-                        c: mdl.UnionSource(
-                            sources=[
-                                mdl.ColumnSource(t, c) 
-                                for t in uts
-                            ]
+                        c: self.interner.intern(
+                            mdl.UnionSource(
+                                sources=[
+                                    mdl.ColumnSource(t, c) 
+                                    for t in uts
+                                ]
+                            )
                         )
                         for c in uts[0].columns
                     }, 
@@ -369,26 +1010,9 @@ class SqlTrace():
                     else:
                         return mdl.ColumnSource(ts, column.name)
             else:
-                select_sources = self.get_select_sources(column.parent_select)
-                traced_ss = [] # for debugging
-                for s in select_sources.values():
-                    try:
-                        ts = self.trace_table_structure(s)
-                        if column.name in ts.columns:
-                            return mdl.ColumnSource(ts, column.name)
-                        else:
-                            traced_ss.append(ts) # for debugging
-                    except Exception as ex:
-                        print(ex)
-                ##debugging
-                print('debugging')
-                for s in self.get_select_sources(column.parent_select).values():
-                    try:
-                        ts = self.trace_table_structure(s)
-                        if column.name in ts.columns:
-                            return mdl.ColumnSource(ts, column.name)
-                    except:
-                        pass
+                entry = self.get_column_entry(column.parent_select, column.name)
+                if entry:
+                    return mdl.ColumnSource(entry[1], column.name)
             return mdl.UnknownSource(f'[Column] {column}')
     
         
@@ -397,10 +1021,9 @@ class SqlTrace():
             if 'table' in column.args:
                 return self.get_table(column.parent_select, column.args['table'])
             else:
-                for s in self.get_select_sources(column.parent_select).values():
-                    ts = self.trace_table_structure(s)
-                    if column.name in ts.columns:
-                        return s.args['this']
+                entry = self.get_column_entry(column.parent_select, column.name)
+                if entry:
+                    return entry[0].args['this']
         
          
         def get_columns_for_table(self, table, name):
@@ -546,9 +1169,8 @@ class SqlTrace():
                 if path.startswith('$.'):
                     path = path[2:]
                 if _type(r) == mdl.PathSource:
-                    #combine
-                    r.path += '.'+path
-                    return r
+                    #combine, traced sources are shared so a new one is built
+                    return mdl.PathSource(r.path+'.'+path, r.source, notes=r.notes, internal=r.internal)
                 else:
                     return mdl.PathSource(path, r)
             elif _type(d) in [exp.JSONBExtractScalar]:
@@ -623,127 +1245,194 @@ class SqlTrace():
                 raise ValueError(f'unhandled: {e}')
         
         def trace(self, e):
-            tracer = self.tracers.get(type(e))
-            if tracer:
-                return tracer(self, e)
-            else:
-                return self._trace(e)
-         
+            handler = self.handlers.get(_type(e))
+            if handler is None:
+                handler = self.get_handler(_type(e), self.tracers)
+                self.handlers[_type(e)] = handler
+            if self.profile:
+                start = self.profile.start()
+                try:
+                    return handler(e)
+                finally:
+                    self.profile.record_expression(_type(e), start)
+            return handler(e)
+        
         def _trace(self, e):
-            if type(e) == exp.Identifier:
-                return self.trace(e.parent)
-            elif type(e) == exp.Column:
-                return self.trace_column(e)
-            elif type(e) in [exp.Alias, exp.Cast, exp.Paren, exp.Max, exp.Min, exp.ArraySize, 
-                             exp.Order, exp.JSONArrayAgg, exp.ArrayAgg, exp.ArrayToString, 
-                             exp.StringToArray, exp.AnyValue, exp.Neg, exp.Where, exp.Initcap,
-                             exp.Length, exp.Sum]:
-                return self.trace(e.args['this'])
-            elif type(e) == exp.Window:
-                return self.trace_window(e)
-            elif type(e) == exp.Coalesce:
-                return self.trace_coalesce(e)
-            elif type(e) == exp.Struct:
-                return self.trace_struct(e)
-            elif type(e) == exp.Case:
-                return self.trace_conditional(e)
-            elif type(e) == exp.DPipe:
-                return self.trace_dpipe(e)
-            elif type(e) in [exp.Array, exp.Concat, exp.Distinct, exp.Unnest]:
-                return mdl.TransformSource(
-                    e.__class__.__name__.upper(), 
-                    [
-                        self.trace(ex) 
-                        for ex in e.expressions
-                    ]
-                )
-            elif type(e) in [exp.Dot, exp.Extract, exp.Kwarg]:
-                return self.trace(e.args['expression'])
-            elif type(e) in [exp.Trim, exp.Upper, exp.Substring, exp.SplitPart, exp.TimeToStr, exp.JSONExtract, 
-                             exp.JSONExtractScalar, exp.JSONBExtractScalar, exp.StrToTime, exp.RegexpReplace,
-                             exp.StrToDate]:
-                return self.trace_function_call(e)
-            elif type(e) == exp.Star:
-                return self.get_star_cols(e.parent_select)
-            elif type(e) == exp.Bracket:
-                col_src = self.trace(e.args['this'])
-                if type(col_src) == mdl.ColumnSource:
-                    return mdl.TransformSource(f'LIST_INDEX[{e.output_name}]', col_src)
-                return col_src
-            elif type(e) in [exp.Literal, exp.CurrentDate, exp.Boolean]:
-                return mdl.ConstantSource(str(e))
-            elif type(e) in [exp.Count, exp.Null, exp.CurrentDate, exp.CurrentTimestamp, exp.Uuid]:
-                return mdl.ConstantSource(e.__class__.__name__.upper())
-            elif isinstance(e, mdl.Source):
-                raise ValueError('something is wrong')
-            elif type(e) in [exp.Lower, exp.Not, exp.UnixToTime, exp.GroupConcat, exp.Explode]:
-                return mdl.TransformSource(e.__class__.__name__.upper(), self.trace(e.args['this']))
-            elif type(e) == exp.Is and type(e.right) == exp.Null:
+            handler = self.default_handlers.get(_type(e))
+            if handler is None:
+                handler = self.get_handler(_type(e))
+                self.default_handlers[_type(e)] = handler
+            return handler(e)
+        
+        def get_handler(self, expression_type, tracers=None):
+            # overrides win over the defaults at the same level, and subclasses
+            # fall back to the handler of their closest registered base class
+            for cls in expression_type.__mro__:
+                if tracers and cls in tracers:
+                    return partial(tracers[cls], self)
+                if cls in self.HANDLERS:
+                    return getattr(self, self.HANDLERS[cls])
+            return self.trace_unknown
+        
+        def trace_parent(self, e):
+            return self.trace(e.parent)
+        
+        def trace_this(self, e):
+            return self.trace(e.args['this'])
+        
+        def trace_expression(self, e):
+            return self.trace(e.args['expression'])
+        
+        def trace_expressions(self, e):
+            return mdl.TransformSource(
+                e.__class__.__name__.upper(), 
+                [
+                    self.trace(ex) 
+                    for ex in e.expressions
+                ]
+            )
+        
+        def trace_star(self, e):
+            return self.get_star_cols(e.parent_select)
+        
+        def trace_bracket(self, e):
+            col_src = self.trace(e.args['this'])
+            if type(col_src) == mdl.ColumnSource:
+                return mdl.TransformSource(f'LIST_INDEX[{e.output_name}]', col_src)
+            return col_src
+        
+        def trace_literal(self, e):
+            return mdl.ConstantSource(str(e))
+        
+        def trace_constant(self, e):
+            return mdl.ConstantSource(e.__class__.__name__.upper())
+        
+        def trace_unary(self, e):
+            return mdl.TransformSource(e.__class__.__name__.upper(), self.trace(e.args['this']))
+        
+        def trace_is(self, e):
+            if type(e.right) == exp.Null:
                 return mdl.TransformSource('IS NULL', [self.trace(e.left)])
-            elif type(e) == exp.In:
-                return mdl.TransformSource(
-                    'IN',
-                    {
-                        'left': self.trace(e.args['this']),
-                        'right': mdl.TransformSource(
-                            'SET',
-                            [self.trace(ex) for ex in e.expressions]            
-                        )
-                    }
-                )
-            elif type(e) == exp.Between:
-                return mdl.TransformSource(
-                    'BETWEEN',
-                    {
-                        'value': self.trace(e.args['this']),
-                        'low': self.trace(e.args['low']),
-                        'high': self.trace(e.args['high'])
-                    }
-                )
-            elif type(e) in [exp.EQ, exp.NEQ, exp.GT, exp.LT, exp.Is, exp.NullSafeNEQ, exp.NullSafeEQ, 
-                             exp.RegexpLike, exp.Like, exp.ILike, exp.Div, exp.Sub, exp.Add, exp.Is, 
-                             exp.And, exp.Or, exp.Mul, exp.LTE, exp.GTE]:
-                return mdl.TransformSource(
-                    e.__class__.__name__.upper(), 
-                    {
-                        'left': self.trace(e.left),
-                        'right': self.trace(e.right)
-                    }
-                )
-            elif type(e) in [exp.Subquery]:
-                table_source = self.trace_table_structure(e)
-                return mdl.CompositeSource(
-                    sources=[
-                        mdl.ColumnSource(table_source, column_name)
-                        for column_name in table_source.columns
-                    ]
-                )
-            elif type(e) in [exp.JSONObjectAgg]:
-                return mdl.TransformSource(
-                    e.__class__.__name__.upper(), 
-                    [
-                        self.trace(e.expressions[0].args['this']),
-                        self.trace(e.expressions[0].args['expression'])
-                    ])
-            elif type(e) in [exp.Filter]:
-                return mdl.TransformSource(
-                    e.__class__.__name__.upper(), 
-                    [
-                        self.trace(e.args['this']),
-                        self.trace(e.args['expression'])
-                    ])
-            elif type(e) in [exp.StrPosition]:
-                return mdl.TransformSource(
-                    e.__class__.__name__.upper(), 
-                    [
-                        self.trace(e.args['this']),
-                        self.trace(e.args['substr'])
-                    ])
-            elif type(e) in [exp.ExplodingGenerateSeries]:
-                return mdl.ConstantSource(value=f'SERIES[{e.args["start"]}..{e.args["end"]}]')
-            elif type(e) == exp.ByteString:
-                return mdl.ConstantSource(value=e.args['this'])
-            elif type(e) == exp.Kwarg:
-                print(e)
-            else:
-                return mdl.UnknownSource(f'[{type(e).__name__}] {e}')
\ No newline at end of file
+            return self.trace_binary(e)
+        
+        def trace_in(self, e):
+            return mdl.TransformSource(
+                'IN',
+                {
+                    'left': self.trace(e.args['this']),
+                    'right': mdl.TransformSource(
+                        'SET',
+                        [self.trace(ex) for ex in e.expressions]            
+                    )
+                }
+            )
+        
+        def trace_between(self, e):
+            return mdl.TransformSource(
+                'BETWEEN',
+                {
+                    'value': self.trace(e.args['this']),
+                    'low': self.trace(e.args['low']),
+                    'high': self.trace(e.args['high'])
+                }
+            )
+        
+        def trace_binary(self, e):
+            return mdl.TransformSource(
+                e.__class__.__name__.upper(), 
+                {
+                    'left': self.trace(e.left),
+                    'right': self.trace(e.right)
+                }
+            )
+        
+        def trace_subquery(self, e):
+            table_source = self.trace_table_structure(e)
+            return mdl.CompositeSource(
+                sources=[
+                    mdl.ColumnSource(table_source, column_name)
+                    for column_name in table_source.columns
+                ]
+            )
+        
+        def trace_json_object_agg(self, e):
+            return mdl.TransformSource(
+                e.__class__.__name__.upper(), 
+                [
+                    self.trace(e.expressions[0].args['this']),
+                    self.trace(e.expressions[0].args['expression'])
+                ])
+        
+        def trace_filter(self, e):
+            return mdl.TransformSource(
+                e.__class__.__name__.upper(), 
+                [
+                    self.trace(e.args['this']),
+                    self.trace(e.args['expression'])
+                ])
+        
+        def trace_str_position(self, e):
+            return mdl.TransformSource(
+                e.__class__.__name__.upper(), 
+                [
+                    self.trace(e.args['this']),
+                    self.trace(e.args['substr'])
+                ])
+        
+        def trace_series(self, e):
+            return mdl.ConstantSource(value=f'SERIES[{e.args["start"]}..{e.args["end"]}]')
+        
+        def trace_byte_string(self, e):
+            return mdl.ConstantSource(value=e.args['this'])
+        
+        def trace_source(self, e):
+            raise ValueError('something is wrong')
+        
+        def trace_unknown(self, e):
+            return mdl.UnknownSource(f'[{type(e).__name__}] {e}')
+        
+        HANDLERS = {
+            exp.Identifier: 'trace_parent',
+            exp.Column: 'trace_column',
+            **{
+                t: 'trace_this' 
+                for t in [exp.Alias, exp.Cast, exp.Paren, exp.Max, exp.Min, exp.ArraySize, 
+                          exp.Order, exp.JSONArrayAgg, exp.ArrayAgg, exp.ArrayToString, 
+                          exp.StringToArray, exp.AnyValue, exp.Neg, exp.Where, exp.Initcap,
+                          exp.Length, exp.Sum]
+            },
+            exp.Window: 'trace_window',
+            exp.Coalesce: 'trace_coalesce',
+            exp.Struct: 'trace_struct',
+            exp.Case: 'trace_conditional',
+            exp.DPipe: 'trace_dpipe',
+            **{t: 'trace_expressions' for t in [exp.Array, exp.Concat, exp.Distinct, exp.Unnest]},
+            **{t: 'trace_expression' for t in [exp.Dot, exp.Extract, exp.Kwarg]},
+            **{
+                t: 'trace_function_call' 
+                for t in [exp.Trim, exp.Upper, exp.Substring, exp.SplitPart, exp.TimeToStr, exp.JSONExtract, 
+                          exp.JSONExtractScalar, exp.JSONBExtractScalar, exp.StrToTime, exp.RegexpReplace,
+                          exp.StrToDate]
+            },
+            exp.Star: 'trace_star',
+            exp.Bracket: 'trace_bracket',
+            **{t: 'trace_literal' for t in [exp.Literal, exp.CurrentDate, exp.Boolean]},
+            **{t: 'trace_constant' for t in [exp.Count, exp.Null, exp.CurrentTimestamp, exp.Uuid]},
+            mdl.Source: 'trace_source',
+            **{t: 'trace_unary' for t in [exp.Lower, exp.Not, exp.UnixToTime, exp.GroupConcat, exp.Explode]},
+            exp.Is: 'trace_is',
+            exp.In: 'trace_in',
+            exp.Between: 'trace_between',
+            **{
+                t: 'trace_binary' 
+                for t in [exp.EQ, exp.NEQ, exp.GT, exp.LT, exp.NullSafeNEQ, exp.NullSafeEQ, 
+                          exp.RegexpLike, exp.Like, exp.ILike, exp.Div, exp.Sub, exp.Add, 
+                          exp.And, exp.Or, exp.Mul, exp.LTE, exp.GTE]
+            },
+            exp.Subquery: 'trace_subquery',
+            exp.JSONObjectAgg: 'trace_json_object_agg',
+            exp.Filter: 'trace_filter',
+            exp.StrPosition: 'trace_str_position',
+            exp.ExplodingGenerateSeries: 'trace_series',
+            exp.ByteString: 'trace_byte_string',
+        }
@@ -101,22 +101,18 @@ class MappingTransform(Transform):
             mapped_node_ids = self.node_ids
         elif self.from_tables is not None:
             mapped_node_ids = []
-            for nid in g.g.nodes:
-                if g.g.nodes[nid]['type'] == 'column':
-                    if type(self.from_tables) == list:
-                        if g.g.nodes[nid]['table'] in self.from_tables:
-                            mapped_node_ids.append(nid)
-                    else:
-                        for t, cs in self.from_tables.items():
-                            if g.g.nodes[nid]['table'] == t and g.g.nodes[nid]['column'] in cs:
-                                mapped_node_ids.append(nid)
-                                break
+            for t in self.from_tables:
+                for nid in g.get_table_nodes(t):
+                    if type(self.from_tables) == list or g.get_node(nid)['column'] in self.from_tables[t]:
+                        mapped_node_ids.append(nid)
         else:
             if self.direction == self.SOURCE:
                 mapped_node_ids = g.get_dest_nodes()
             else:
                 mapped_node_ids = g.get_src_nodes()
             
+        mapped_node_ids = set(mapped_node_ids)
+            
         def get_to_nodes(g, node_id):
             node_attrs = g.nodes[node_id]
             if node_attrs['type'] == 'column' and \
@@ -0,0 +1,36 @@
+import networkx as nx
+from networkx.classes.digraph import DiGraph
+from networkx.classes.coreviews import FilterAtlas, FilterAdjacency
+from sqlgraph.store import GraphStore, StoreNodes, StoreAdjacency
+
+
+class SubgraphView(DiGraph):
+    # a frozen subgraph view, nodes and edges are looked up in the underlying
+    # graph or store through the filters instead of being copied
+    @classmethod
+    def create(cls, g, node_ids, *, filter_edge=None):
+        filter_node = nx.filters.show_nodes(node_ids)
+        filter_edge = filter_edge or nx.filters.no_filter
+        view = nx.freeze(cls())
+        if type(g) == GraphStore:
+            view._node = FilterAtlas(StoreNodes(g), filter_node)
+            succ = StoreAdjacency(g, True)
+            pred = StoreAdjacency(g, False)
+        else:
+            # set up like nx.subgraph_view, so a subgraph of the view filters g
+            view._NODE_OK = filter_node
+            view._EDGE_OK = filter_edge
+            view._graph = g
+            view.graph = g.graph
+            view._node = FilterAtlas(g._node, filter_node)
+            succ = g._succ
+            pred = g._pred
+        view._succ = FilterAdjacency(succ, filter_node, filter_edge)
+        view._pred = FilterAdjacency(pred, filter_node, lambda u, v: filter_edge(v, u))
+        return view
+
+    def materialize(self):
+        g = DiGraph()
+        g.add_nodes_from((node_id, dict(attrs)) for node_id, attrs in self.nodes.items())
+        g.add_edges_from((u, v, dict(attrs)) for u, v, attrs in self.edges(data=True))
+        return g
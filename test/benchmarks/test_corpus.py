@@ -0,0 +1,16 @@
+import unittest
+from benchmarks.corpus import generate_corpus
+
+
+class CorpusTests(unittest.TestCase):
+    def test_deterministic(self):
+        corpus = generate_corpus(40, seed=7)
+        again = generate_corpus(40, seed=7)
+        self.assertEqual(corpus.sqls, again.sqls)
+        self.assertEqual(corpus.schema, again.schema)
+        self.assertEqual(corpus.columns, again.columns)
+        self.assertEqual(corpus.layers, again.layers)
+        self.assertEqual(40, len(corpus.sqls))
+
+        # the seed picks the model shapes, another seed gives another corpus
+        self.assertNotEqual(corpus.sqls, generate_corpus(40, seed=8).sqls)
@@ -0,0 +1,255 @@
+import unittest
+import importlib.util
+import networkx as nx
+from sqlgraph.trace import SqlTrace
+from sqlgraph.graph import SqlGraph
+from sqlgraph.schema import DictSchema
+from test.dialect import PostgresExtended
+
+TABLES = {
+    'test_db': {
+        'test_schema': {
+            'person': ['person_id', 'name', 'first_name', 'last_name']
+        }
+    }
+}
+
+SQLs = {
+    'people': """\
+      WITH named AS (SELECT person_id, UPPER(name) AS name FROM person)
+      SELECT person_id, name FROM named
+    """,
+    'names': """\
+      SELECT COALESCE(name, 'n/a') AS name, person_id || name AS label FROM people
+    """,
+    'structs': """\
+      SELECT
+        JSON_BUILD_OBJECT('first_name', first_name, 'last_name', last_name) AS name,
+        person_id
+      FROM person
+    """,
+    'fields': """\
+      SELECT
+        name->'first_name' || person_id AS fn,
+        person_id,
+        COALESCE(person_id, 0) AS pid,
+        'x' AS c
+      FROM structs
+    """
+}
+
+
+class GraphTests(unittest.TestCase):
+    def setUp(self):
+        self.trace = SqlTrace.trace_sql(SQLs, dialect=PostgresExtended, schema=DictSchema(TABLES))
+        self.g = self.trace.to_graph()
+
+    def test_compact_graph(self):
+        g = self.g
+        compacted = self.trace.to_graph().compact()
+        self.assertIsNotNone(compacted.store)
+
+        for g_ in [g, compacted]:
+            g_.add_table_group('base', ['test_db.test_schema.person'])
+            g_.add_table_group('marts', ['names'])
+
+        self.assertEqual(g.ancestors('names.label'), compacted.ancestors('names.label'))
+        self.assertEqual(g.descendants('test_db.test_schema.person.name'), compacted.descendants('test_db.test_schema.person.name'))
+        self.assertEqual(sorted(g.get_nodes_in_groups('base')), sorted(compacted.get_nodes_in_groups('base')))
+        self.assertEqual(
+            g.get_group_source_mapping('marts', src_groups=['base']),
+            compacted.get_group_source_mapping('marts', src_groups=['base'])
+        )
+
+        # direct access to the networkx graph expands it again
+        self.assertEqual(sorted(g.g.edges), sorted(compacted.g.edges))
+        self.assertIsNone(compacted.store)
+        self.assertEqual(g.g.nodes['names.name'], compacted.g.nodes['names.name'])
+
+    def test_group_mapping_sweep(self):
+        g = self.g
+        g.add_table_group('src', ['test_db.test_schema.person'])
+        g.add_table_group('dest', {'fields': ['person_id', 'pid', 'c']})
+        g.add_table_group('struct', {'fields': ['fn']})
+
+        for kwargs in [{'src_groups': ['src']}, {'src_groups': 'src'}, {}]:
+            expected = {'fields': {}}
+            for node_id in g.get_nodes_in_groups(['dest']):
+                expected['fields'][g.get_node(node_id)['column']] = g.get_source_mapping(node_id, dest_groups=['dest'], **kwargs)
+            self.assertEqual(expected, g.get_group_source_mapping(['dest'], **kwargs))
+
+        # fields.fn has a struct upstream and is mapped by get_source_mapping,
+        # the other columns are swept, both come back sorted
+        expected = {'fields': {}}
+        for node_id in g.get_nodes_in_groups(['dest', 'struct']):
+            expected['fields'][g.get_node(node_id)['column']] = g.get_source_mapping(node_id, dest_groups=['dest', 'struct'], excluded_groups=['src'])
+        self.assertEqual(['structs.name', 'structs.person_id'], expected['fields']['fn'])
+        self.assertEqual(expected, g.get_group_source_mapping(['dest', 'struct'], excluded_groups=['src']))
+
+        # the path names through a struct still go through the per node walk
+        for kwargs in [{'src_groups': ['src']}, {}]:
+            with self.assertRaises(ValueError):
+                g.get_group_source_mapping(['struct'], **kwargs)
+
+        self.assertEqual(
+            {
+                'fields': {
+                    'c': ["'x'"],
+                    'person_id': ['structs.person_id', 'test_db.test_schema.person.person_id'],
+                    'pid': ['structs.person_id', 'test_db.test_schema.person.person_id']
+                }
+            },
+            g.get_group_source_mapping(['dest'])
+        )
+        self.assertEqual(
+            g.get_group_source_mapping(['dest'], src_groups=['src']),
+            g.get_group_source_mapping('dest', src_groups='src')
+        )
+
+        for kwargs in [{'dest_groups': ['dest']}, {'dest_groups': 'dest'}]:
+            expected = {'test_db.test_schema.person': {}}
+            for node_id in g.get_nodes_in_groups(['src']):
+                expected['test_db.test_schema.person'][g.get_node(node_id)['column']] = g.get_dest_mapping(node_id, src_groups=['src'], **kwargs)
+            self.assertEqual(expected, g.get_group_dest_mapping(['src'], **kwargs))
+
+        mapping = g.get_group_dest_mapping(['src'], dest_groups=['dest'])
+        self.assertEqual(['fields.person_id', 'fields.pid'], mapping['test_db.test_schema.person']['person_id'])
+        self.assertEqual([], mapping['test_db.test_schema.person']['last_name'])
+        g.add_table_group('src_id', {'test_db.test_schema.person': ['person_id']})
+        self.assertEqual(
+            {'test_db.test_schema.person': {'person_id': ['fields.fn', 'fields.person_id', 'fields.pid', 'names.label', 'people.person_id', 'structs.person_id']}},
+            g.get_group_dest_mapping(['src_id'])
+        )
+        with self.assertRaises(ValueError):
+            g.get_group_dest_mapping(['src'])
+
+    def test_shared_sources(self):
+        # traced sources are shared and left as they are, so every graph built
+        # from a trace is the same and cte columns keep their table type
+        other = self.trace.to_graph()
+        self.assertEqual(self.g.to_dict(), other.to_dict())
+        self.assertEqual('cte', other.get_node('people_0.cte.named.name')['table_type'])
+        self.assertEqual(['test_db.test_schema.person.name'], other.get_source_mapping('people.name'))
+
+    @unittest.skipUnless(importlib.util.find_spec('scipy'), 'scipy is not installed')
+    def test_lineage_matrix(self):
+        g = self.g
+        g.add_table_group('base', ['test_db.test_schema.person'])
+        g.add_table_group('marts', ['names'])
+
+        matrix, rows, columns = g.to_lineage_matrix(src_groups='base', dest_groups='marts')
+        self.assertEqual(
+            ['test_db.test_schema.person.person_id', 'test_db.test_schema.person.name', 'test_db.test_schema.person.first_name', 'test_db.test_schema.person.last_name'],
+            list(rows)
+        )
+        self.assertEqual(['names.name', 'names.label'], list(columns))
+        self.assertEqual([[0, 1], [1, 1], [0, 0], [0, 0]], matrix.toarray().astype(int).tolist())
+
+        # cte columns are walked through but left out
+        matrix, rows, columns = g.to_lineage_matrix()
+        self.assertIn('people_0.cte.named.name', g.g.nodes)
+        self.assertNotIn('people_0.cte.named.name', list(rows))
+        lineage = {(rows[i], columns[j]) for i, j in zip(*matrix.nonzero())}
+        self.assertIn(('test_db.test_schema.person.name', 'people.name'), lineage)
+        self.assertIn(('people.name', 'names.label'), lineage)
+        self.assertNotIn(('names.name', 'people.name'), lineage)
+
+        compacted, _, _ = g.compact().to_lineage_matrix()
+        self.assertEqual(0, (compacted != matrix).nnz)
+
+    def test_node_indexes(self):
+        g = self.trace.to_graph(table_group='models')
+        self.assertEqual(
+            {
+                'people.person_id', 'people.name', 'names.name', 'names.label', 'structs.name', 'structs.person_id',
+                'fields.fn', 'fields.person_id', 'fields.pid', 'fields.c'
+            },
+            set(g.get_nodes_in_groups('models'))
+        )
+
+        g.add_table_group('base', 'test_schema.person')
+        g.add_table_group('name', {'people': ['name'], 'names': ['name']})
+        # nodes added again keep their place, the indexes follow the graph order
+        person = [
+            'test_db.test_schema.person.person_id', 'test_db.test_schema.person.name',
+            'test_db.test_schema.person.first_name', 'test_db.test_schema.person.last_name'
+        ]
+        self.assertEqual(person, g.get_nodes_in_groups(['base']))
+        self.assertEqual({'names.name', 'people.name'}, set(g.get_nodes_in_groups('name')))
+        self.assertEqual(['names.name', 'names.label'], g.get_table_nodes('names'))
+        self.assertEqual(['people.name', 'names.name'], list(g.get_nodes(types=['column'], table_groups=['name'])))
+        self.assertEqual({'structs.name.source': g.g.nodes['structs.name.source']}, g.get_nodes(types=['struct']))
+        self.assertEqual(list(g.g.nodes), list(g.get_nodes()))
+        self.assertTrue(SqlGraph.intersects('base', ['models', 'base']))
+
+        self.trace.update({'people': 'SELECT person_id, name, 1 AS one FROM person'}, graph=g)
+        self.assertIn('people.one', g.get_table_nodes('people'))
+        self.assertEqual({'names.name', 'people.name'}, set(g.get_nodes_in_groups('name')))
+
+        # the maintained indexes match a fresh build
+        indexes = g.indexes
+        g.reset_indexes()
+        rebuilt = g._get_indexes()
+        for name in ['types', 'tables', 'names', 'table_types', 'groups']:
+            self.assertEqual(
+                {k: list(v) for k, v in getattr(rebuilt, name).items()},
+                {k: list(v) for k, v in getattr(indexes, name).items()}
+            )
+
+        # changes that keep the node count are noticed too
+        g._add_node({'id': 'names.label', 'type': 'column', 'table': 'labels', 'table_type': 'table', 'column': 'label'})
+        self.assertNotIn('names.label', g.get_table_nodes('names'))
+        g._add_edge('people.one', 'orphan')
+        self.assertIn('orphan', g.get_nodes())
+        self.assertIsNot(rebuilt, g._get_indexes())
+
+        g.compact()
+        rebuilt = g.indexes
+        self.assertEqual(person, g.get_nodes_in_groups(['base']))
+        self.assertEqual(['people.name', 'names.name'], list(g.get_nodes(types=['column'], table_groups=['name'])))
+        self.assertIsNotNone(g.store)
+        self.assertIs(rebuilt, g.indexes)
+
+    def test_graph_views(self):
+        g = self.g
+        g.add_table_group('models', ['people'])
+
+        sg = g.get_source_graph('names.name')
+        self.assertIn('test_db.test_schema.person.name', sg.nodes)
+        self.assertNotIn('people.person_id', sg.nodes)
+        self.assertEqual(g.g.nodes['people.name'], sg.nodes['people.name'])
+        with self.assertRaises(nx.NetworkXError):
+            sg.remove_node('people.name')
+
+        # group nodes cut the walk, their own inputs are left out
+        sg = g.get_source_graph('names.name', 'models')
+        self.assertIn('people.name', sg.nodes)
+        self.assertNotIn('test_db.test_schema.person.name', sg.nodes)
+        self.assertEqual([], list(sg.in_edges('people.name')))
+
+        dg = g.get_dest_graph('test_db.test_schema.person.name', ['models'])
+        self.assertEqual([], list(dg.out_edges('people.name')))
+        self.assertNotIn('names.name', dg.nodes)
+
+        materialized = dg.materialize()
+        materialized.remove_node('people.name')
+        self.assertIn('people.name', dg.nodes)
+        self.assertIn('people.name', g.g.nodes)
+
+        # views of a compacted graph read the store, the graph stays compacted
+        compacted = self.trace.to_graph().compact()
+        compacted.add_table_group('models', ['people'])
+        for node_id, groups in [('names.name', None), ('names.name', 'models')]:
+            view = compacted.get_source_graph(node_id, groups)
+            expected = g.get_source_graph(node_id, groups)
+            self.assertIsInstance(view, nx.DiGraph)
+            self.assertEqual(dict(expected.nodes(data=True)), dict(view.nodes(data=True)))
+            self.assertEqual(sorted(expected.edges(data=True)), sorted(view.edges(data=True)))
+        self.assertEqual(
+            nx.shortest_path(sg, 'people.name', 'names.name'),
+            nx.shortest_path(view, 'people.name', 'names.name')
+        )
+        between = compacted.between(['test_db.test_schema.person.name'], ['names.name'])
+        self.assertEqual(sorted(g.between(['test_db.test_schema.person.name'], ['names.name']).edges), sorted(between.edges))
+        self.assertEqual(list(between.materialize().edges), list(between.edges))
+        self.assertIsNotNone(compacted.store)
@@ -0,0 +1,93 @@
+import unittest
+import networkx as nx
+from sqlgraph.graph import SqlGraph
+from sqlgraph.reach import ReachabilityIndex
+from networkx.classes.digraph import DiGraph
+
+
+class ReachabilityTests(unittest.TestCase):
+    def test_reachability(self):
+        g = DiGraph([
+            ['node1', 'node2'],
+            ['node2', 'node3'],
+            ['node3', 'node4'],
+            ['node5', 'node3'],
+            ['node4', 'node6'],
+            ['node6', 'node4'],
+            ['node6', 'node7'],
+        ])
+        g.add_node('node8')
+
+        index = ReachabilityIndex.from_networkx(g)
+        for node_id in g.nodes:
+            self.assertEqual(nx.ancestors(g, node_id), index.ancestors(node_id))
+            self.assertEqual(nx.descendants(g, node_id), index.descendants(node_id))
+            for other_id in g.nodes:
+                self.assertEqual(other_id in nx.ancestors(g, node_id), index.is_upstream(other_id, node_id))
+
+        self.assertTrue(index.is_upstream('node1', 'node7'))
+        self.assertFalse(index.is_upstream('node7', 'node1'))
+        self.assertFalse(index.is_upstream('node8', 'node8'))
+        self.assertTrue(index.is_upstream('node6', 'node4'))
+
+    def test_graph_reachability(self):
+        sg = SqlGraph()
+        sg.g = DiGraph([
+            ['node1', 'node2'],
+            ['node2', 'node3'],
+        ])
+        sg.build_reachability()
+        self.assertEqual({'node1', 'node2'}, sg.ancestors('node3'))
+        self.assertTrue(sg.is_upstream('node1', 'node3'))
+
+        # new nodes and edges drop the index, the next query rebuilds it
+        sg._add_node({'id': 'node4', 'type': 'column', 'table': 'table0'})
+        sg._add_node({'id': 'node6', 'type': 'column', 'table': 'table1'})
+        sg._add_edge('node3', 'node4')
+        self.assertEqual({'node1', 'node2', 'node3'}, sg.ancestors('node4'))
+
+        sg.g.remove_edge('node1', 'node2')
+        sg.reset_reachability()
+        self.assertFalse(sg.is_upstream('node1', 'node4'))
+
+        # changes that keep the node count are noticed too
+        sg._add_edge('node1', 'node4')
+        self.assertTrue(sg.is_upstream('node1', 'node4'))
+        sg.remove_table('table1')
+        sg._add_node({'id': 'node5', 'type': 'column', 'table': 'table2'})
+        sg._add_edge('node4', 'node5')
+        self.assertEqual({'node1', 'node2', 'node3', 'node4'}, sg.ancestors('node5'))
+
+        sg.compact()
+        self.assertEqual({'node1', 'node2', 'node3'}, sg.ancestors('node4'))
+        self.assertTrue(sg.reachability.matches(sg.store, sg.version))
+
+    def test_between(self):
+        # a chain of diamonds has 2^n paths from end to end
+        edges = []
+        for i in range(30):
+            edges += [
+                [f'node{i}', f'left{i}'],
+                [f'node{i}', f'right{i}'],
+                [f'left{i}', f'node{i + 1}'],
+                [f'right{i}', f'node{i + 1}'],
+            ]
+        sg = SqlGraph()
+        sg.g = DiGraph(edges + [['other', 'node1'], ['node30', 'last'], ['node5', 'side']])
+
+        between = sg.between(['node0'], ['node30'])
+        self.assertEqual(set(sg.g.nodes) - {'other', 'last', 'side'}, set(between.nodes))
+        self.assertEqual(120, len(between.edges))
+        self.assertNotIn(('other', 'node1'), between.edges)
+
+        between = sg.between(['node0', 'other'], ['node2', 'side'])
+        self.assertEqual(
+            {'node0', 'left0', 'right0', 'node1', 'left1', 'right1', 'node2', 'other', 'node3', 'left2', 'right2', 'node4', 'left3', 'right3', 'node5', 'left4', 'right4', 'side'},
+            set(between.nodes)
+        )
+        self.assertIn(('other', 'node1'), between.edges)
+
+        self.assertEqual(set(), set(sg.between(['node30'], ['node0']).nodes))
+        with self.assertRaises(ValueError):
+            sg.between(['missing'], ['node0'])
+        self.assertEqual(set(between.nodes), set(sg.compact().between(['node0', 'other'], ['node2', 'side']).nodes))
@@ -0,0 +1,60 @@
+from sqlgraph.schema import DictSchema, TableResolver
+from sqlgraph.trace import SqlTrace
+from test.dialect import PostgresExtended
+import unittest
+import pickle
+
+class TableResolverTests(unittest.TestCase):
+    
+    def test_catalog_qualified(self):
+        schema = DictSchema(
+            {
+                'catalog1': {
+                    'test_db': {
+                        'test_table': ['column1']
+                    }
+                },
+                'catalog2': {
+                    'test_db': {
+                        'test_table': ['column2']
+                    }
+                }
+            }
+        )
+        resolver = TableResolver(schema)
+        
+        self.assertEqual(['column1'], resolver.get_table('test_table', 'test_db', 'catalog1').columns)
+        self.assertEqual(['column2'], resolver.get_table('test_table', 'test_db', 'catalog2').columns)
+        self.assertEqual(['column1'], resolver.get_table('test_table', 'test_db', 'catalog1').columns)
+        self.assertEqual({'hits': 1, 'misses': 2, 'evictions': 0, 'size': 2}, resolver.stats())
+        
+        SQLs = {
+            'combined': """\
+              SELECT a.column1, b.column2 
+              FROM catalog1.test_db.test_table a 
+              JOIN catalog2.test_db.test_table b ON TRUE
+            """
+        }
+        t = SqlTrace.trace_sql(SQLs, dialect=PostgresExtended, schema=resolver)
+        sources = t.table('combined').sources
+        self.assertEqual('catalog1.test_db.test_table', sources['column1'].table.id)
+        self.assertEqual('catalog2.test_db.test_table', sources['column2'].table.id)
+        self.assertEqual(3, resolver.stats()['hits'])
+        
+    def test_lru_and_negative_cache(self):
+        resolver = TableResolver(DictSchema({'c': {'d': {'t1': ['a'], 't2': ['b']}}}), max_size=2)
+        
+        self.assertIsNone(resolver.get_table('missing'))
+        self.assertIsNone(resolver.get_table('missing'))
+        self.assertEqual(1, resolver.hits)
+        
+        resolver.get_table('t1')
+        resolver.get_table('t2')
+        self.assertEqual(1, resolver.evictions)
+        self.assertNotIn(TableResolver.key('missing'), resolver.tables)
+        
+        resolver.invalidate('t1')
+        self.assertEqual([TableResolver.key('t2')], list(resolver.tables.keys()))
+        
+        copy = pickle.loads(pickle.dumps(resolver))
+        self.assertEqual(['b'], copy.get_table('t2').columns)
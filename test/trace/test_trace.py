@@ -1,7 +1,15 @@
 import unittest
+import tempfile
+import os
+import json
+import pickle
+from sqlglot import exp
 from sqlgraph.trace import SqlTrace
+from sqlgraph.cache import ParseCache
+from sqlgraph.scan import ReferenceScanner
 from test.dialect import PostgresExtended
 from sqlgraph.schema import DictSchema
+from sqlgraph import model as mdl
 
 
 class TraceTests(unittest.TestCase):
@@ -75,4 +83,659 @@ class TraceTests(unittest.TestCase):
         print(t)
         
         
-        
\ No newline at end of file
+    def test_parallel_trace(self):
+        TABLES = {
+            'test_db': {
+                'test_schema': {
+                    'person': [
+                        'person_id',
+                        'name_first',
+                        'name_last',
+                    ],
+                    'address': [
+                        'person_id',
+                        'address',
+                        'city'
+                    ]
+                }
+            }
+        }
+        
+        SQLs = {
+            'formatted_address': """\
+              SELECT
+                name_first || ' ' || name_last AS name,
+                address || ' ' || city as address
+              FROM named_address
+            """,
+            'named_address': """\
+              WITH people AS (
+                SELECT * FROM test_db.test_schema.person
+              )
+              SELECT
+                name_first,
+                name_last,
+                address,
+                city
+              FROM people p
+              JOIN test_db.test_schema.address a
+                ON p.person_id = a.person_id
+            """,
+            'cities': """\
+              SELECT DISTINCT city FROM named_address
+            """
+        }
+        
+        schema = DictSchema(TABLES)
+        serial = SqlTrace.trace_sql(SQLs, dialect=PostgresExtended, schema=schema)
+        parallel = SqlTrace.trace_sql(SQLs, dialect=PostgresExtended, schema=schema, workers=2)
+        
+        self.assertEqual(list(serial.tables.keys()), list(parallel.tables.keys()))
+        for table_id, table_source in serial.tables.items():
+            self.assertEqual(table_source.to_dict(), parallel.tables[table_id].to_dict())
+            
+        self.assertIs(
+            parallel.tables['named_address'],
+            parallel.tables['cities'].sources['city'].table
+        )
+
+    def test_parse_cache(self):
+        SQLs = {
+            'table_1': """
+              SELECT
+                NULL::TEXT as col_1,
+                NULL::BOOLEAN as col_2
+            """,
+            'table_2': """
+              SELECT
+                *
+              FROM table_1
+            """
+        }
+        
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ParseCache(directory)
+            first = SqlTrace.trace_sql(SQLs, dialect=PostgresExtended, parse_cache=cache)
+            self.assertEqual({'hits': 0, 'misses': 2}, {k: v for k, v in cache.stats().items() if k in ['hits', 'misses']})
+            
+            second = SqlTrace.trace_sql(SQLs, dialect=PostgresExtended, parse_cache=ParseCache(directory))
+            cache = ParseCache(directory)
+            SqlTrace.trace_sql(SQLs, dialect=PostgresExtended, parse_cache=cache)
+            self.assertEqual(2, cache.hits)
+            self.assertEqual(0, cache.misses)
+            for table_id, table_source in first.tables.items():
+                self.assertEqual(table_source.to_dict(), second.tables[table_id].to_dict())
+            
+            # rewriting an entry replaces its size instead of adding to it
+            size = cache.size
+            key = cache.key('SELECT 1', PostgresExtended)
+            cache.put(key, 'first')
+            cache.put(key, 'first')
+            self.assertEqual(size + os.path.getsize(cache.path(key)), cache.size)
+            
+            cache.evict(0)
+            self.assertEqual(0, cache.size)
+            self.assertEqual(3, cache.evictions)
+    
+    def test_update(self):
+        TABLES = {
+            'test_db': {
+                'test_schema': {
+                    'person': [
+                        'person_id',
+                        'name_first',
+                        'name_last',
+                    ]
+                }
+            }
+        }
+        
+        SQLs = {
+            'names': """\
+              SELECT name_first, name_last FROM person
+            """,
+            'full_names': """\
+              SELECT name_first || ' ' || name_last AS name FROM names
+            """,
+            'ids': """\
+              SELECT person_id FROM person
+            """
+        }
+        
+        changed = {
+            'names': """\
+              SELECT UPPER(name_first) AS name_first, name_last FROM person
+            """
+        }
+        
+        schema = DictSchema(TABLES)
+        traced = SqlTrace.trace_sql(SQLs, dialect=PostgresExtended, schema=schema)
+        g = traced.to_graph()
+        ids = traced.tables['ids']
+        
+        retraced = traced.update(changed, graph=g)
+        self.assertEqual(['names', 'full_names'], retraced)
+        self.assertIs(ids, traced.tables['ids'])
+        
+        expected = SqlTrace.trace_sql({**SQLs, **changed}, dialect=PostgresExtended, schema=schema)
+        for table_id, table_source in expected.tables.items():
+            self.assertEqual(table_source.to_dict(), traced.tables[table_id].to_dict())
+        
+        expected_graph = expected.to_graph()
+        self.assertEqual(sorted(expected_graph.g.nodes), sorted(g.g.nodes))
+        self.assertEqual(sorted(expected_graph.g.edges), sorted(g.g.edges))
+
+    def test_update_shadowed_table(self):
+        TABLES = {
+            'c': {
+                'd': {
+                    'people': ['id', 'email']
+                }
+            }
+        }
+
+        SQLs = {
+            'a': """\
+              SELECT x.id, x.email FROM people x
+            """
+        }
+
+        added = {
+            'people': """\
+              SELECT 1 AS id, 2 AS email FROM base
+            """
+        }
+
+        schema = DictSchema(TABLES)
+        traced = SqlTrace.trace_sql(SQLs, dialect=PostgresExtended, schema=schema)
+        g = traced.to_graph()
+        self.assertIn(('c.d.people.id', 'a.id'), g.g.edges)
+
+        # the added model shadows the schema table a was traced against
+        retraced = traced.update(added, graph=g)
+        self.assertEqual({'a', 'people'}, set(retraced))
+
+        expected = SqlTrace.trace_sql({**SQLs, **added}, dialect=PostgresExtended, schema=schema)
+        self.assertEqual({'people'}, traced.tracer.dependencies['a'])
+        for table_id, table_source in expected.tables.items():
+            self.assertEqual(table_source.to_dict(), traced.tables[table_id].to_dict())
+        expected_graph = expected.to_graph()
+        self.assertEqual(sorted(expected_graph.g.nodes), sorted(g.g.nodes))
+        self.assertEqual(sorted(expected_graph.g.edges), sorted(g.g.edges))
+        self.assertIn(('people.id', 'a.id'), g.g.edges)
+
+        # removing it again falls back to the schema
+        traced.update({'people': None}, graph=g)
+        self.assertIn(('c.d.people.id', 'a.id'), g.g.edges)
+        self.assertNotIn('people.id', g.g.nodes)
+
+    def test_cte_traced_once(self):
+        TABLES = {
+            'test_db': {
+                'test_schema': {
+                    'source': ['col_1', 'col_2', 'col_3']
+                }
+            }
+        }
+        
+        SQL = """\
+          WITH base AS (
+            SELECT * FROM source
+          )
+          SELECT
+            col_1,
+            col_2,
+            col_3 AS renamed
+          FROM base
+        """
+        
+        t = SqlTrace.trace_sql(SQL, 'cte_test', dialect=PostgresExtended, schema=DictSchema(TABLES))
+        sources = t.tables['cte_test'].sources
+        self.assertEqual(['col_1', 'col_2', 'renamed'], list(sources.keys()))
+        self.assertIs(sources['col_1'].table, sources['col_2'].table)
+        self.assertIs(sources['col_1'].table, sources['renamed'].table)
+    
+    def test_unqualified_join_columns(self):
+        TABLES = {
+            'test_db': {
+                'test_schema': {
+                    'person': ['person_id', 'name'],
+                    'address': ['address_person_id', 'city']
+                }
+            }
+        }
+        
+        SQL = """\
+          WITH cities AS (
+            SELECT address_person_id, city FROM address
+          )
+          SELECT
+            name,
+            city,
+            missing
+          FROM person
+          JOIN cities
+            ON person_id = address_person_id
+        """
+        
+        t = SqlTrace.trace_sql(SQL, 'join_test', dialect=PostgresExtended, schema=DictSchema(TABLES))
+        sources = t.tables['join_test'].sources
+        self.assertEqual('test_db.test_schema.person', sources['name'].table.id)
+        self.assertEqual('cte', sources['city'].table.type)
+        self.assertEqual('unknown', sources['missing'].to_dict()['type'])
+    
+    def test_iter_trace(self):
+        TABLES = {
+            'test_db': {
+                'test_schema': {
+                    'person': ['person_id', 'name']
+                }
+            }
+        }
+        
+        SQLs = {
+            'names': """\
+              SELECT UPPER(name) AS name FROM people
+            """,
+            'people': """\
+              SELECT person_id, name FROM person
+            """,
+            'ids': """\
+              SELECT person_id FROM people
+            """
+        }
+        
+        schema = DictSchema(TABLES)
+        expected = SqlTrace.trace_sql(SQLs, dialect=PostgresExtended, schema=schema)
+        
+        streamed = list(SqlTrace.iter_trace(SQLs, dialect=PostgresExtended, schema=schema))
+        self.assertEqual(['people', 'names', 'ids'], [table_id for table_id, _ in streamed])
+        for table_id, table_source in streamed:
+            self.assertEqual(expected.tables[table_id].to_dict(), table_source.to_dict())
+        
+        # the models before the broken one are still streamed, the error keeps its cause
+        streamed = []
+        with self.assertRaises(ValueError) as cm:
+            for table_id, _ in SqlTrace.iter_trace({**SQLs, 'broken': 'SELECT FROM ('}, dialect=PostgresExtended, schema=schema):
+                streamed.append(table_id)
+        self.assertEqual(['people', 'names', 'ids'], streamed)
+        self.assertIn('broken', str(cm.exception))
+        self.assertIsNotNone(cm.exception.__cause__)
+    
+    def test_lazy_trace(self):
+        TABLES = {
+            'test_db': {
+                'test_schema': {
+                    'person': ['person_id', 'name']
+                }
+            }
+        }
+        
+        SQLs = {
+            'names': """\
+              SELECT UPPER(name) AS name FROM people
+            """,
+            'people': """\
+              SELECT person_id, name FROM person
+            """,
+            'ids': """\
+              SELECT person_id FROM person
+            """
+        }
+        
+        schema = DictSchema(TABLES)
+        expected = SqlTrace.trace_sql(SQLs, dialect=PostgresExtended, schema=schema)
+        
+        lazy = SqlTrace.trace_sql(SQLs, dialect=PostgresExtended, schema=schema, lazy=True)
+        self.assertEqual({}, lazy.tracer.traced_tables)
+        self.assertEqual(expected.tables['names'].to_dict(), lazy.table('names').to_dict())
+        self.assertEqual(['people', 'names'], list(lazy.tracer.traced_tables.keys()))
+        
+        self.assertIn('ids', lazy.tables)
+        self.assertEqual(['names', 'people', 'ids'], list(lazy.tables.keys()))
+        self.assertEqual(
+            {table_id: table_source.to_dict() for table_id, table_source in expected.tables.items()},
+            {table_id: table_source.to_dict() for table_id, table_source in lazy.tables.items()}
+        )
+    
+    def test_trace_directory(self):
+        TABLES = {
+            'test_db': {
+                'test_schema': {
+                    'person': ['person_id', 'name']
+                }
+            }
+        }
+        
+        FILES = {
+            'people.sql': "SELECT person_id, name FROM person",
+            'marts/names.sql': "SELECT UPPER(name) AS name FROM people",
+            'marts/ids.sql': "SELECT person_id FROM people",
+            'scratch/draft.sql': "SELECT nonsense FROM",
+            'README.md': "not sql",
+        }
+        
+        with tempfile.TemporaryDirectory() as directory:
+            for path, sql in FILES.items():
+                os.makedirs(os.path.dirname(os.path.join(directory, path)), exist_ok=True)
+                with open(os.path.join(directory, path), 'w') as f:
+                    f.write(sql)
+            
+            self.assertEqual(
+                ['ids', 'names', 'people'], 
+                sorted(SqlTrace.list_models(directory, exclude='scratch/*'))
+            )
+            
+            t = SqlTrace.trace_directory(
+                directory, 
+                exclude=['scratch/*'], 
+                mmap_threshold=0, 
+                dialect=PostgresExtended, 
+                schema=DictSchema(TABLES)
+            )
+            self.assertEqual(['ids', 'names', 'people'], sorted(t.tables.keys()))
+            
+            t = SqlTrace.trace_directory(
+                directory, 
+                models=['names'],
+                include_upstream=True,
+                dialect=PostgresExtended, 
+                schema=DictSchema(TABLES)
+            )
+            self.assertEqual(['people', 'names'], list(t.tables.keys()))
+            self.assertEqual('people', t.table('names').sources['name'].sources[0].table.id)
+
+            with open(os.path.join(directory, 'marts/names.sql'), 'w') as f:
+                f.write("SELECT UPPER(name) AS name FROM test_schema.people")
+            t = SqlTrace.trace_directory(
+                directory,
+                models=['names'],
+                include_upstream=True,
+                dialect=PostgresExtended,
+                schema=DictSchema(TABLES),
+                db='test_schema'
+            )
+            self.assertEqual(['test_schema.names', 'test_schema.people'], sorted(t.tables.keys()))
+    
+    def test_include_upstream(self):
+        SQLs = {
+            'base': "SELECT 1 AS id",
+            'middle': "SELECT id FROM \"base\" -- not FROM unused",
+            'top': "SELECT m.id, 'unused' AS label FROM middle m /* unused */",
+            'unused': "SELECT nonsense FROM",
+        }
+        
+        self.assertEqual({'middle'}, ReferenceScanner(SQLs.keys()).references(SQLs['top']))
+        
+        t = SqlTrace.trace_sql(SQLs, models=['top'], include_upstream=True, dialect=PostgresExtended)
+        self.assertEqual(['base', 'middle', 'top'], sorted(t.tables.keys()))
+        
+        t = SqlTrace.trace_sql(SQLs, models=['top'], excluded_models=['base'], include_upstream=True, dialect=PostgresExtended, schema=DictSchema({'c': {'d': {'base': ['id']}}}))
+        self.assertEqual(['middle', 'top'], sorted(t.tables.keys()))
+
+        # models qualified with db and catalog are referenced by their qualified names
+        SQLs = {
+            'base': "SELECT 1 AS id",
+            'middle': "SELECT id FROM analytics.base",
+            'top': "SELECT id FROM analytics.middle",
+        }
+        with self.assertNoLogs('sqlgraph.trace', level='WARNING'):
+            t = SqlTrace.trace_sql(SQLs, models=['top'], include_upstream=True, dialect=PostgresExtended, db='analytics')
+        self.assertEqual(['analytics.base', 'analytics.middle', 'analytics.top'], sorted(t.tables.keys()))
+
+        SQLs['top'] = "SELECT id FROM warehouse.analytics.middle"
+        t = SqlTrace.trace_sql(SQLs, models=['top'], include_upstream=True, dialect=PostgresExtended, db='analytics', catalog='warehouse')
+        self.assertEqual(['warehouse.analytics.base', 'warehouse.analytics.middle', 'warehouse.analytics.top'], sorted(t.tables.keys()))
+
+    def test_profile(self):
+        TABLES = {
+            'test_db': {
+                'test_schema': {
+                    'person': ['person_id', 'name']
+                }
+            }
+        }
+        
+        SQLs = {
+            'names': """\
+              SELECT UPPER(name) AS name, person_id FROM people
+            """,
+            'people': """\
+              SELECT person_id, name FROM person
+            """
+        }
+        
+        t = SqlTrace.trace_sql(SQLs, dialect=PostgresExtended, schema=DictSchema(TABLES), profile=True)
+        profile = t.tracer.profile.to_dict()
+        
+        self.assertEqual({'names', 'people'}, set(profile['models'].keys()))
+        self.assertGreaterEqual(profile['models']['names']['time'], profile['models']['people']['time'])
+        self.assertEqual(4, profile['expressions']['Column']['calls'])
+        self.assertEqual(1, profile['expressions']['Upper']['calls'])
+        self.assertEqual({'hits': 0, 'misses': 2}, profile['caches']['column_cache'])
+        self.assertEqual(profile, json.loads(t.tracer.profile.to_json()))
+
+        
+    def test_trace_columns(self):
+        TABLES = {
+            'test_db': {
+                'test_schema': {
+                    'person': ['person_id', 'name', 'email']
+                }
+            }
+        }
+        
+        SQLs = {
+            'people': """\
+              SELECT person_id, UPPER(name) AS name, email FROM person
+            """,
+            'names': """\
+              WITH p AS (SELECT * FROM people)
+              SELECT name AS display_name, LOWER(email) AS email, person_id FROM p
+            """
+        }
+        
+        schema = DictSchema(TABLES)
+        full = SqlTrace.trace_sql(SQLs, dialect=PostgresExtended, schema=schema)
+        t = SqlTrace.trace_sql(SQLs, dialect=PostgresExtended, schema=schema, columns={'names': ['display_name']})
+        
+        self.assertEqual(['names'], list(t.tables.keys()))
+        self.assertEqual(['display_name'], t.table('names').columns)
+        self.assertEqual(
+            full.table('names').sources['display_name'].to_dict(), 
+            t.table('names').sources['display_name'].to_dict()
+        )
+        
+        g = t.to_graph()
+        self.assertIn('people.name', g.g.nodes)
+        self.assertNotIn('people.email', g.g.nodes)
+        self.assertNotIn('people.person_id', g.g.nodes)
+        
+        with self.assertRaises(ValueError):
+            SqlTrace.trace_sql(SQLs, dialect=PostgresExtended, schema=schema, columns={'names': ['missing']})
+
+        
+    def test_script(self):
+        TABLES = {
+            'test_db': {
+                'test_schema': {
+                    'person': ['person_id', 'name', 'email']
+                }
+            }
+        }
+        
+        SQLs = {
+            'people': """\
+              DROP TABLE IF EXISTS tmp_people;
+              CREATE TEMP TABLE tmp_people AS 
+                SELECT person_id, UPPER(name) AS name FROM test_schema.person;
+              INSERT INTO tmp_people SELECT person_id, email FROM test_schema.person;
+              SELECT name AS display_name FROM tmp_people;
+            """,
+            'names': """\
+              SELECT display_name FROM people
+            """
+        }
+        
+        t = SqlTrace.trace_sql(SQLs, dialect=PostgresExtended, schema=DictSchema(TABLES))
+        
+        source = t.table('people').sources['display_name']
+        self.assertEqual('people.temp.tmp_people', source.table.id)
+        self.assertEqual('temp', source.table.type)
+        self.assertEqual(['person_id', 'name'], source.table.columns)
+        self.assertEqual({'people'}, t.tracer.dependencies['names'])
+        
+        g = t.to_graph()
+        g.add_table_group('dest', ['names'])
+        g.add_table_group('src', ['test_db.test_schema.person'])
+        mapping = g.get_group_source_mapping(['dest'], src_groups=['src'])
+        self.assertEqual(
+            {'test_db.test_schema.person.name', 'test_db.test_schema.person.email'},
+            set(mapping['names']['display_name'])
+        )
+
+        
+    def test_interned_sources(self):
+        TABLES = {
+            'test_db': {
+                'test_schema': {
+                    'person': ['person_id', 'name']
+                }
+            }
+        }
+        
+        SQL = """\
+          SELECT
+            COALESCE(CAST(name AS TEXT), 'n/a') AS name_1,
+            COALESCE(CAST(name AS TEXT), 'n/a') AS name_2,
+            COALESCE(CAST(person_id AS TEXT), 'n/a') AS person_id,
+            COALESCE(UPPER(name), UPPER(name)) AS upper_name
+          FROM person
+        """
+        
+        t = SqlTrace.trace_sql(SQL, 'people', dialect=PostgresExtended, schema=DictSchema(TABLES))
+        sources = t.table('people').sources
+        self.assertIs(sources['name_1'], sources['name_2'])
+        self.assertIsNot(sources['name_1'], sources['person_id'])
+        self.assertIs(sources['name_1'].sources[1], sources['person_id'].sources[1])
+        
+        # shared subtrees are built once and linked from every other reference
+        g = t.to_graph()
+        self.assertIn(('people.name_1.source', 'people.name_2'), g.g.edges)
+        self.assertNotIn('people.name_2.source', g.g.nodes)
+        self.assertIn(('people.name_1.source.source.[1]', 'people.person_id.source'), g.g.edges)
+        self.assertNotIn('people.person_id.source.source.[1]', g.g.nodes)
+        self.assertEqual(g.get_source_mapping('people.name_1'), g.get_source_mapping('people.name_2'))
+        self.assertIsNot(str, type(sources['name_1'].sources[0].table))
+        
+        # a subtree repeated under one node keeps an edge for every position
+        self.assertEqual(
+            [0, 1],
+            sorted(attrs['seq'] for _, _, attrs in g.g.in_edges('people.upper_name.source', data=True))
+        )
+        
+        # the shared nodes go with the table
+        g.remove_table('people')
+        self.assertEqual([], [node_id for node_id in g.g.nodes if node_id.startswith('people.')])
+
+    def test_table_id(self):
+        table = mdl.Table('person', ['person_id'])
+        self.assertEqual('person', table.id)
+
+        # the id is cached, changing any part of it resets the cache
+        table.db = 'test_schema'
+        self.assertEqual('test_schema.person', table.id)
+        table.catalog = 'test_db'
+        self.assertEqual('test_db.test_schema.person', table.id)
+        table.name = 'people'
+        self.assertEqual('test_db.test_schema.people', table.id)
+        table.db = None
+        self.assertEqual('people', table.id)
+
+        table = pickle.loads(pickle.dumps(mdl.Table('person', ['person_id'], 'test_schema', 'test_db')))
+        self.assertEqual('test_db.test_schema.person', table.id)
+        table.name = 'people'
+        self.assertEqual('test_db.test_schema.people', table.id)
+        
+    def test_snapshot(self):
+        TABLES = {
+            'test_db': {
+                'test_schema': {
+                    'person': ['person_id', 'name']
+                }
+            }
+        }
+        
+        SQLs = {
+            'people': """\
+              SELECT person_id, name FROM person
+            """,
+            'names': """\
+              SELECT UPPER(name) AS name, person_id FROM people
+            """
+        }
+        
+        t = SqlTrace.trace_sql(SQLs, dialect=PostgresExtended, schema=DictSchema(TABLES))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'trace.snapshot')
+            t.save(path)
+            loaded = SqlTrace.load(path)
+            
+            self.assertEqual(list(t.tables.keys()), list(loaded.tables.keys()))
+            for table_id, table_source in t.tables.items():
+                self.assertEqual(table_source.to_dict(), loaded.tables[table_id].to_dict())
+            self.assertIs(loaded.table('people'), loaded.table('names').sources['person_id'].table)
+            self.assertIs(
+                loaded.table('people').sources['name'].table, 
+                loaded.table('people').sources['person_id'].table
+            )
+            self.assertEqual(sorted(t.to_graph().g.edges), sorted(loaded.to_graph().g.edges))
+            
+            with open(path, 'wb') as f:
+                f.write(b'not a snapshot')
+            with self.assertRaises(ValueError):
+                SqlTrace.load(path)
+            
+            
+    def test_lateral_unnest_column(self):
+        TABLES = {
+            'test_db': {
+                'test_schema': {
+                    'tagged': ['id', 'tags']
+                }
+            }
+        }
+        
+        SQL = """\
+          SELECT id, elem FROM tagged CROSS JOIN LATERAL UNNEST(tags) AS u(elem)
+        """
+        
+        # the unnest refers back to tags in its own select, resolving it must
+        # not trace the unnest again
+        with self.assertNoLogs('sqlgraph.trace', level='WARNING'):
+            t = SqlTrace.trace_sql(SQL, 'tag_list', dialect=PostgresExtended, schema=DictSchema(TABLES))
+        sources = t.table('tag_list').sources
+        self.assertEqual('test_db.test_schema.tagged', sources['id'].table.id)
+        unnested = sources['elem'].table.sources['elem'].sources[0]
+        self.assertEqual('test_db.test_schema.tagged', unnested.table.id)
+        self.assertEqual('tags', unnested.column)
+            
+            
+    def test_handler_fallback(self):
+        class ShoutUpper(exp.Upper):
+            pass
+        
+        tracer = SqlTrace.Tracer({}, dialect=PostgresExtended)
+        # a subclass without its own entry resolves through its base classes
+        self.assertEqual(tracer.trace_function_call, tracer.get_handler(ShoutUpper))
+        self.assertEqual(tracer.trace_this, tracer.get_handler(exp.Cast))
+        self.assertEqual(tracer.trace_unknown, tracer.get_handler(exp.Expression))
+        
+        # overrides registered for a base class apply to its subclasses too
+        traced = []
+        override = lambda t, e: traced.append(e) or t.trace_function_call(e)
+        handler = tracer.get_handler(ShoutUpper, {exp.Upper: override})
+        source = handler(ShoutUpper(this=exp.Literal.string('a')))
+        self.assertEqual(1, len(traced))
+        self.assertEqual('ShoutUpper', type(traced[0]).__name__)
+        self.assertEqual('transform', source.to_dict()['type'])